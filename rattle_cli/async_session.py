@@ -0,0 +1,170 @@
+import base64
+from functools import partial
+import hashlib
+import hmac
+import logging
+import os
+import time
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
+import uuid
+
+
+# OAuth percent-encodes everything but the unreserved characters
+escape = partial(quote, safe='~')
+
+
+def oauth_header(method, url, params, consumer_key, consumer_secret,
+                 token, token_secret, nonce=None, timestamp=None):
+    # The Authorization header for an OAuth 1.0a request signed with
+    # HMAC-SHA1 (RFC 5849). `params` are the form or query parameters,
+    # which are signed along with the ones in the URL.
+    oauth = {'oauth_consumer_key': consumer_key,
+             'oauth_nonce': nonce or uuid.uuid4().hex,
+             'oauth_signature_method': 'HMAC-SHA1',
+             'oauth_timestamp': str(int(timestamp or time.time())),
+             'oauth_token': token,
+             'oauth_version': '1.0'}
+
+    parts = urlsplit(url)
+    parameters = parse_qsl(parts.query, keep_blank_values=True)
+    parameters += [(name, str(value)) for name, value in params.items()]
+    parameters += oauth.items()
+    normalised = '&'.join('%s=%s' % pair for pair in sorted(
+        (escape(name), escape(value)) for name, value in parameters))
+
+    # Without the query string or the default port
+    netloc = parts.netloc.lower()
+    default_port = {'http': ':80', 'https': ':443'}.get(parts.scheme.lower())
+    if default_port and netloc.endswith(default_port):
+        netloc = netloc[:-len(default_port)]
+    base_url = '%s://%s%s' % (parts.scheme.lower(), netloc, parts.path or '/')
+
+    base_string = '&'.join(escape(part) for part in
+                           (method.upper(), base_url, normalised))
+    key = '%s&%s' % (escape(consumer_secret), escape(token_secret or ''))
+    digest = hmac.new(key.encode('utf-8'), base_string.encode('utf-8'),
+                      hashlib.sha1).digest()
+    oauth['oauth_signature'] = base64.b64encode(digest).decode('ascii')
+
+    return 'OAuth ' + ', '.join('%s="%s"' % (escape(name), escape(value))
+                                for name, value in sorted(oauth.items()))
+
+
+class AsyncResponse():
+
+    # The parts of a requests response that Goodreads and the scheduler use
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class AsyncGoodreadsSession():
+
+    # Same as GoodreadsSession, for asyncio: the requests are signed here
+    # and sent with aiohttp, so that hundreds of them can wait on the
+    # network at the same time from a single thread. It can't authorise the
+    # app by itself, `authorise` is called for that when there's no access
+    # token file yet, e.g. GoodreadsSession.set_session.
+
+    filename = '.access_token'
+    timeout = 60
+
+    def __init__(self, api_key, api_secret, pool_size=100, scheduler=None,
+                 filename=None, authorise=None):
+        self.logger = logging.getLogger('async_session')
+        if filename is not None:
+            self.filename = filename
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.access_token = None
+        self.access_token_secret = None
+        self.scheduler = scheduler
+        self.authorise = authorise
+        # At most that many connections, the other requests wait for one
+        self.pool_size = pool_size
+        self.client = None
+        self.requests = 0
+        self.connections = 0
+
+    def set_session(self):
+        if not os.path.isfile(self.filename):
+            if self.authorise is None:
+                raise RuntimeError("No access token in %s" % self.filename)
+            self.authorise()
+        with open(self.filename, 'r') as f:
+            access_token = f.readlines()
+        self.access_token = access_token[0].strip()
+        self.access_token_secret = access_token[1].strip()
+
+    def create_client(self):
+        # aiohttp is only needed for --async, and the client only once
+        # there's a running loop to tie it to
+        import aiohttp
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self.request_ended)
+        trace.on_connection_create_end.append(self.connection_created)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace])
+
+    async def request_ended(self, client, context, params):
+        self.requests += 1
+
+    async def connection_created(self, client, context, params):
+        self.connections += 1
+
+    def connection_stats(self):
+        return {'requests': self.requests,
+                'new_connections': self.connections,
+                'reused_connections': self.requests - self.connections}
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def get(self, url, params=None):
+        return await self.request('get', url, params or {})
+
+    async def post(self, url, data=None):
+        return await self.request('post', url, data or {})
+
+    async def request(self, method, url, params):
+        if self.access_token is None:
+            self.set_session()
+        if self.client is None:
+            self.client = self.create_client()
+        if self.scheduler is None:
+            return await self.send(url, method, params)
+        return await self.scheduler.send_async(self.send, url, method,
+                                               params)
+
+    async def send(self, url, method, params):
+        import aiohttp
+        headers = {'Authorization': oauth_header(
+            method, url, params, self.api_key, self.api_secret,
+            self.access_token, self.access_token_secret)}
+        body = None
+        if method == 'post':
+            body = urlencode(params)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif params:
+            url += ('&' if urlsplit(url).query else '?') + urlencode(params)
+
+        try:
+            async with self.client.request(method.upper(), url, data=body,
+                                           headers=headers) as response:
+                content = await response.read()
+        except aiohttp.ClientError as e:
+            # What the scheduler retries, without having to know about
+            # aiohttp
+            raise ConnectionError(str(e)) from e
+        self.logger.debug("%s %s: %s", method.upper(), url, response.status)
+        return AsyncResponse(response.status, response.headers, content)
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import time
+
+
+def read_manifest(filename):
+    # A JSON object of user names to their access token files, e.g.
+    # {"alice": "tokens/alice", "bob": "tokens/bob"}, where relative paths
+    # are relative to the manifest itself
+    with open(filename, 'r') as f:
+        users = json.load(f, object_pairs_hook=OrderedDict)
+    directory = os.path.dirname(filename)
+    return OrderedDict((name, os.path.join(directory, token_file))
+                       for name, token_file in users.items())
+
+
+class BatchRun():
+
+    # Fetches the stats of several users at the same time. What fetching
+    # means is up to `fetch`, which gets a user name and their access token
+    # file and returns the number of books per language. The users should
+    # share a rate limiter, so that adding workers doesn't mean sending more
+    # requests than Goodreads allows, only waiting less between them.
+
+    total_label = 'all users'
+
+    def __init__(self, fetch, workers=4):
+        self.logger = logging.getLogger('batch')
+        self.fetch = fetch
+        self.workers = workers
+        self.seconds = {}
+        self.failures = OrderedDict()
+
+    def run(self, users):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = OrderedDict(
+                (name, executor.submit(self.fetch_user, name, token_file))
+                for name, token_file in users.items())
+        return self.collect(OrderedDict(
+            (name, future.result()) for name, future in futures.items()))
+
+    async def run_async(self, users):
+        # With `fetch` a coroutine, everyone's downloads take turns on the
+        # event loop rather than needing a thread each, and `workers` is
+        # ignored
+        import asyncio
+        counts = await asyncio.gather(*(
+            self.fetch_user_async(name, token_file)
+            for name, token_file in users.items()))
+        return self.collect(OrderedDict(zip(users, counts)))
+
+    def collect(self, counts_by_user):
+        results = OrderedDict()
+        for name, counts in counts_by_user.items():
+            if counts is not None:
+                results[name] = counts
+            elif name not in self.failures:
+                self.failures[name] = "unknown error"
+        return results
+
+    def fetch_user(self, name, token_file):
+        if not self.has_token(name, token_file):
+            return None
+
+        start = time.perf_counter()
+        try:
+            counts = self.fetch(name, token_file)
+        except (Exception, SystemExit) as e:
+            return self.failed(name, e)
+        return self.done(name, start, counts)
+
+    async def fetch_user_async(self, name, token_file):
+        if not self.has_token(name, token_file):
+            return None
+
+        start = time.perf_counter()
+        try:
+            counts = await self.fetch(name, token_file)
+        except (Exception, SystemExit) as e:
+            return self.failed(name, e)
+        return self.done(name, start, counts)
+
+    def has_token(self, name, token_file):
+        if not os.path.isfile(token_file):
+            # Nobody will be around to authorise the app halfway through
+            self.logger.error("No access token for %s in %s", name,
+                              token_file)
+            self.failures[name] = "no access token in %s" % token_file
+            return False
+        return True
+
+    def failed(self, name, e):
+        # One user's problems shouldn't stop the stats for everyone else
+        self.logger.exception("Couldn't get the reviews for %s", name)
+        self.failures[name] = str(e) or e.__class__.__name__
+        return None
+
+    def done(self, name, start, counts):
+        self.seconds[name] = time.perf_counter() - start
+        self.logger.info("Got the reviews for %s in %.1fs", name,
+                         self.seconds[name])
+        return counts
+
+    @classmethod
+    def with_total(cls, results):
+        # The per-user counts, followed by everyone's put together
+        total = OrderedDict()
+        for counts in results.values():
+            for lang, count in counts.items():
+                total[lang] = total.get(lang, 0) + count
+        table = OrderedDict(results)
+        table[cls.total_label] = total
+        return table
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Compares parse_date with plain strptime on the dates of a page of
+# synthetic reviews. Run with: python -m rattle_cli.benchmarks.bench_dates
+
+import argparse
+from datetime import datetime
+import re
+import timeit
+
+from rattle_cli.goodreads import DATE_FORMAT, parse_date
+from rattle_cli.tests.xml_fixtures import GoodreadsXMLFactory
+
+
+def review_dates(reviews):
+    xml = GoodreadsXMLFactory().create_full_xml_response(reviews=reviews)
+    return re.findall("<read_at>(.*)</read_at>", xml)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Date parsing benchmark")
+    parser.add_argument("--reviews", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    dates = review_dates(args.reviews)
+    timings = {
+        'strptime': lambda: [datetime.strptime(d, DATE_FORMAT)
+                             for d in dates],
+        'parse_date': lambda: [parse_date(d) for d in dates],
+    }
+
+    results = {}
+    for name, function in sorted(timings.items()):
+        best = min(timeit.repeat(function, number=1, repeat=args.repeat))
+        results[name] = best
+        print("%-10s %8.2f ms  %10.0f dates/s" % (
+            name, best * 1000, len(dates) / best))
+
+    print("speedup    %8.1fx" % (results['strptime'] / results['parse_date']))
+
+
+if __name__ == "__main__":
+    main()
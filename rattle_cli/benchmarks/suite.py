@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Throughput and memory benchmarks for parsing and sorting reviews, using
+# synthetic review pages and a fake session instead of the Goodreads API.
+#
+#   python -m rattle_cli.benchmarks.suite --output results.json
+#   python -m rattle_cli.benchmarks.suite --baseline results.json
+#
+# The second command exits with an error if anything got slower or uses
+# more memory than in the baseline, give or take --tolerance.
+
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from functools import partial
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+import xmltodict
+
+from rattle_cli.bookarranger import BookArranger, ColumnarBookArranger
+from rattle_cli.goodreads import Goodreads
+from rattle_cli.tests.xml_fixtures import GoodreadsXMLFactory
+
+PER_PAGE = 200
+LANGUAGES = ['Self #1', 'Self #2']
+
+
+class FakeResponse():
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class FakeSession():
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def post(self, url, data, **kwargs):
+        return FakeResponse(self.pages[data['page'] - 1])
+
+
+def create_pages(size):
+    xml_factory = GoodreadsXMLFactory()
+    pages = []
+    for start in range(1, size + 1, PER_PAGE):
+        end = min(start + PER_PAGE - 1, size)
+        xml = xml_factory.create_full_xml_response(
+            reviews=size, authors=2, shelves=3, start_cnt=start, end_cnt=end)
+        pages.append(xml.encode('utf-8'))
+    return pages
+
+
+def parsed_reviews(pages):
+    reviews = []
+    for page in pages:
+        page = xmltodict.parse(page)[Goodreads.main_tag]['reviews']
+        reviews.extend(page['review'] if isinstance(page['review'], list)
+                       else [page['review']])
+    return reviews
+
+
+# Each setup function gets the pages and returns the function to time, which
+# must handle every review once. Anything to clean up afterwards goes in the
+# function's `close` attribute.
+
+def setup_get_books(pages):
+    return lambda: Goodreads(FakeSession(pages)).get_books()
+
+
+def setup_get_books_streaming(pages):
+    return lambda: Goodreads(FakeSession(pages), streaming=True).get_books()
+
+
+def setup_get_books_processes(pages, workers):
+    # Pages are downloaded `workers` at a time and each parsed in the pool.
+    # Tracing allocations only sees the main process, i.e. the books coming
+    # back rather than the parsing itself.
+    pool = ProcessPoolExecutor(max_workers=workers)
+    # Start the processes before timing anything
+    list(pool.map(abs, range(workers)))
+
+    def get_books():
+        return Goodreads(FakeSession(pages), pool=pool).get_books(
+            jobs=workers)
+    get_books.close = pool.shutdown
+    return get_books
+
+
+def setup_parse_date_read(pages):
+    goodreads = Goodreads(None)
+    reviews = parsed_reviews(pages)
+    return lambda: [goodreads.parse_date_read(review, "")
+                    for review in reviews]
+
+
+def setup_parse_author(pages):
+    goodreads = Goodreads(None)
+    reviews = parsed_reviews(pages)
+    return lambda: [goodreads.parse_author(review) for review in reviews]
+
+
+def setup_parse_shelves(pages):
+    goodreads = Goodreads(None)
+    reviews = parsed_reviews(pages)
+    return lambda: [goodreads.parse_shelves(review) for review in reviews]
+
+
+def setup_sort_by_language(pages):
+    books = Goodreads(FakeSession(pages)).get_books()
+    return lambda: BookArranger(books).sort_by_language(LANGUAGES, True)
+
+
+def setup_sort_by_year_and_language(pages):
+    books = Goodreads(FakeSession(pages)).get_books()
+    return lambda: BookArranger(books).sort_by_year_and_language(
+        LANGUAGES, True)
+
+
+def setup_count_by_year_and_language_columnar(pages):
+    books = Goodreads(FakeSession(pages)).get_books()
+    return lambda: ColumnarBookArranger(books).count_by_year_and_language(
+        LANGUAGES, True)
+
+
+def setup_print_sorted_books_nicely(pages):
+    books = Goodreads(FakeSession(pages)).get_books()
+    arranger = BookArranger(books)
+    sorted_books = arranger.sort_by_language(LANGUAGES, True)
+
+    def print_books():
+        with contextlib.redirect_stdout(io.StringIO()):
+            arranger.print_sorted_books_nicely(sorted_books, details=True)
+    return print_books
+
+
+BENCHMARKS = OrderedDict([
+    ('get_books', setup_get_books),
+    ('get_books_streaming', setup_get_books_streaming),
+    ('get_books_processes_1', partial(setup_get_books_processes, workers=1)),
+    ('get_books_processes_2', partial(setup_get_books_processes, workers=2)),
+    ('get_books_processes_4', partial(setup_get_books_processes, workers=4)),
+    ('parse_date_read', setup_parse_date_read),
+    ('parse_author', setup_parse_author),
+    ('parse_shelves', setup_parse_shelves),
+    ('sort_by_language', setup_sort_by_language),
+    ('sort_by_year_and_language', setup_sort_by_year_and_language),
+    ('count_by_year_and_language_columnar',
+     setup_count_by_year_and_language_columnar),
+    ('print_sorted_books_nicely', setup_print_sorted_books_nicely),
+])
+
+
+def run_benchmark(name, pages, size, repeat=3):
+    function = BENCHMARKS[name](pages)
+    try:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        # Tracing allocations slows everything down, so memory gets its own
+        # run
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        close = getattr(function, 'close', None)
+        if close is not None:
+            close()
+
+    return {'seconds': best,
+            'reviews_per_second': size / best,
+            'peak_memory': peak}
+
+
+def run_suite(sizes, names=None, repeat=3):
+    results = OrderedDict()
+    for size in sizes:
+        pages = create_pages(size)
+        for name in names or BENCHMARKS:
+            results['%s/%d' % (name, size)] = run_benchmark(
+                name, pages, size, repeat)
+    return results
+
+
+def find_regressions(results, baseline, tolerance=0.2):
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]
+        if (result['reviews_per_second'] <
+                before['reviews_per_second'] * (1 - tolerance)):
+            regressions.append("%s: %.0f reviews/s, was %.0f" % (
+                key, result['reviews_per_second'],
+                before['reviews_per_second']))
+        if result['peak_memory'] > before['peak_memory'] * (1 + tolerance):
+            regressions.append("%s: %d bytes peak memory, was %d" % (
+                key, result['peak_memory'], before['peak_memory']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for parsing and sorting Goodreads reviews")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000],
+                        help="Number of reviews to benchmark with")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS),
+                        help="Only run these benchmarks")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Keep the best time out of this many runs")
+    parser.add_argument("--output", help="Save the results to a JSON file")
+    parser.add_argument("--baseline",
+                        help="JSON file of earlier results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="How much worse than the baseline is still \
+                        acceptable. Default value: 0.2 (20%%)")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.benchmarks, args.repeat)
+    for key, result in results.items():
+        print("%-45s %12.0f reviews/s %10.1f MiB" % (
+            key, result['reviews_per_second'],
+            result['peak_memory'] / 2 ** 20))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("Regression: %s" % regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,28 @@
+from array import array
+from collections import defaultdict, OrderedDict
+from datetime import date, datetime, timedelta, timezone
+
+
 class BookArranger():
 
     def __init__(self, books):
-        self.books = books
+        self.books = []
+        # Inverted indexes, from shelf names and years read to the position
+        # of the books in self.books
+        self.shelf_index = defaultdict(set)
+        self.year_index = defaultdict(set)
+        for book in books:
+            self.add(book)
+
+    def add(self, book):
+        position = len(self.books)
+        self.books.append(book)
+        for shelf in book.shelves:
+            self.shelf_index[shelf].add(position)
+        # Books without a (valid) date read don't belong to any year
+        year = getattr(book.date_read, 'year', None)
+        if year is not None:
+            self.year_index[year].add(position)
 
     # The language code is not available on the general reviews list,
     # and even on the book details page it is not always
@@ -17,27 +38,405 @@ class BookArranger():
         if other:
             sorted_books[other_label] = []
 
-        for book in self.books:
-            if year is not None:
-                if not book.date_read or book.date_read.year != year:
-                    continue
+        if year is None:
+            remaining = set(range(len(self.books)))
+        else:
+            remaining = self.year_index.get(year, set())
 
-            for lang in languages:
-                if lang in book.shelves:
-                    sorted_books[lang].append(book)
-                    break
-            else:
-                if other:
-                    sorted_books[other_label].append(book)
+        # A book on several of the language shelves only counts towards the
+        # first one
+        for lang in languages:
+            matches = remaining & self.shelf_index.get(lang, set())
+            remaining = remaining - matches
+            sorted_books[lang].extend(self.books[i] for i in sorted(matches))
+
+        if other:
+            sorted_books[other_label].extend(
+                self.books[i] for i in sorted(remaining))
+
+        return sorted_books
+
+    # Same as sort_by_language, for several years at once. Each book's
+    # language is only worked out once, then the books are split by year.
+    def sort_by_year_and_language(self, languages=None, other=False,
+                                  other_label='default', years=None):
+        if years is None:
+            years = sorted(self.year_index)
+
+        all_books = self.sort_by_language(languages, other, other_label)
+        sorted_books = OrderedDict(
+            (year, {lang: [] for lang in all_books}) for year in years)
+
+        for lang, books in all_books.items():
+            for book in books:
+                year = getattr(book.date_read, 'year', None)
+                if year in sorted_books:
+                    sorted_books[year][lang].append(book)
 
         return sorted_books
 
     def print_sorted_books_nicely(self, books, details=False):
         print("Books read based on Goodreads reviews")
+        self.print_books(books, details)
 
+    @staticmethod
+    def print_books(books, details=False):
         for lang in sorted(books.keys()):
             print("%s: %d" % (lang, len(books[lang])))
             if details:
                 for book in books[lang]:
                     print("%s, by %s" % (book.title, book.author))
                 print("")
+
+    @staticmethod
+    def print_table_nicely(books):
+        # One row per year or shelf, with the number of books per language
+        LanguageCounter.print_table_nicely(OrderedDict(
+            (row, {lang: len(books[row][lang]) for lang in books[row]})
+            for row in books))
+
+
+class ColumnarBookArranger():
+
+    # Same groupings as BookArranger, for large libraries. Rather than a
+    # list of Book objects, each field is a column: typed arrays for the
+    # dates, and ids into a list of unique values for titles, authors and
+    # shelf combinations. Shelf and year membership become bitsets, one
+    # Python int per shelf or year with bit i set for the i-th book, so that
+    # the grouping is a handful of & and ~ over whole ints rather than a
+    # loop over the books.
+
+    no_date = -2 ** 63
+    epoch = date(1970, 1, 1).toordinal()
+
+    def __init__(self, books=()):
+        self.size = 0
+        # To hand out the same kind of books as were added, see view()
+        self.book_type = None
+        self.titles, self.title_ids, self.title_codes = [], array('I'), {}
+        self.authors, self.author_ids, self.author_codes = [], array('I'), {}
+        self.shelf_sets, self.shelf_set_ids = [], array('I')
+        self.shelf_set_codes = {}
+        # Seconds since the epoch, and the UTC offset in minutes
+        self.dates = array('q')
+        self.offsets = array('h')
+        self.timezone_offsets = {}
+        self.estimated = array('b')
+        # Read dates Goodreads sent that we couldn't parse
+        self.other_dates = {}
+        # Positions of the books for each combination of shelves and each
+        # year, turned into bitsets the first time they're needed
+        self.shelf_set_positions = []
+        self.year_positions = {}
+        self.bitsets = {}
+        # Books put back together by view(), so that they only get created
+        # once
+        self.views = {}
+        for book in books:
+            self.add(book)
+
+    print_sorted_books_nicely = BookArranger.print_sorted_books_nicely
+    print_books = staticmethod(BookArranger.print_books)
+    print_table_nicely = staticmethod(BookArranger.print_table_nicely)
+
+    @staticmethod
+    def encode(values, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def add(self, book):
+        if self.book_type is None:
+            self.book_type = type(book)
+        position = self.size
+        self.size += 1
+        if self.bitsets:
+            self.bitsets.clear()
+
+        self.title_ids.append(self.encode(self.titles, self.title_codes,
+                                          book.title))
+        self.author_ids.append(self.encode(self.authors, self.author_codes,
+                                           book.author))
+        # Book shelves are shared frozensets already, see Book.intern_shelves
+        shelves = book.shelves
+        if not isinstance(shelves, frozenset):
+            shelves = frozenset(shelves)
+        code = self.encode(self.shelf_sets, self.shelf_set_codes, shelves)
+        if code == len(self.shelf_set_positions):
+            self.shelf_set_positions.append(array('I'))
+        self.shelf_set_ids.append(code)
+        self.shelf_set_positions[code].append(position)
+
+        date_read = book.date_read
+        self.estimated.append(bool(book.date_read_estimated))
+        if isinstance(date_read, date) and not isinstance(date_read,
+                                                          datetime):
+            date_read = datetime(date_read.year, date_read.month,
+                                 date_read.day)
+        if isinstance(date_read, datetime):
+            # Quicker than timestamp(), which matters with 100k books
+            offset = self.utcoffset(date_read)
+            self.dates.append(
+                (date_read.toordinal() - self.epoch) * 86400 +
+                date_read.hour * 3600 + date_read.minute * 60 +
+                date_read.second - offset * 60)
+            self.offsets.append(offset)
+            year = date_read.year
+            if year not in self.year_positions:
+                self.year_positions[year] = array('I')
+            self.year_positions[year].append(position)
+        else:
+            self.dates.append(self.no_date)
+            self.offsets.append(0)
+            if date_read:
+                self.other_dates[position] = date_read
+
+    def utcoffset(self, date_read):
+        # In minutes, with naive dates counting as UTC. Goodreads dates all
+        # come with one of a few fixed offsets, no need to work them out
+        # again for every book.
+        tzinfo = date_read.tzinfo
+        offset = self.timezone_offsets.get(tzinfo)
+        if offset is None:
+            delta = date_read.utcoffset() or timedelta(0)
+            offset = int(delta.total_seconds()) // 60
+            if tzinfo is None or isinstance(tzinfo, timezone):
+                self.timezone_offsets[tzinfo] = offset
+        return offset
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def to_bitset(positions, size):
+        bits = bytearray((size + 7) // 8)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, 'little')
+
+    @staticmethod
+    def positions(bitset):
+        # The positions of the bits set, in order
+        data = bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+        for index, byte in enumerate(data):
+            if byte:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield index * 8 + bit
+
+    @staticmethod
+    def count(bitset):
+        return bin(bitset).count('1')
+
+    def shelf_bitset(self, shelf):
+        key = ('shelf', shelf)
+        if key not in self.bitsets:
+            bitset = 0
+            for code, shelves in enumerate(self.shelf_sets):
+                if shelf in shelves:
+                    bitset |= self.to_bitset(self.shelf_set_positions[code],
+                                             self.size)
+            self.bitsets[key] = bitset
+        return self.bitsets[key]
+
+    def year_bitset(self, year=None):
+        # Every book if there's no year
+        if year is None:
+            return (1 << self.size) - 1
+        key = ('year', year)
+        if key not in self.bitsets:
+            self.bitsets[key] = self.to_bitset(
+                self.year_positions.get(year, ()), self.size)
+        return self.bitsets[key]
+
+    def masks_by_language(self, languages=None, other=False,
+                          other_label='default', year=None):
+        # Same rules as BookArranger.sort_by_language, with a bitset of the
+        # books for each language
+        masks = {}
+        remaining = self.year_bitset(year)
+        for lang in languages or []:
+            masks[lang] = remaining & self.shelf_bitset(lang)
+            remaining &= ~masks[lang]
+        if other:
+            masks[other_label] = remaining
+        return masks
+
+    def count_by_language(self, languages=None, other=False,
+                          other_label='default', year=None):
+        return {lang: self.count(mask) for lang, mask in
+                self.masks_by_language(languages, other, other_label,
+                                       year).items()}
+
+    def count_by_year_and_language(self, languages=None, other=False,
+                                   other_label='default', years=None):
+        if years is None:
+            years = sorted(self.year_positions)
+        masks = self.masks_by_language(languages, other, other_label)
+        return OrderedDict(
+            (year, {lang: self.count(mask & self.year_bitset(year))
+                    for lang, mask in masks.items()})
+            for year in years)
+
+    # The same output as BookArranger, for the code that wants the books
+    # themselves. They are put back together from the columns, with the
+    # fields the reports use.
+    def sort_by_language(self, languages=None, other=False,
+                         other_label='default', year=None):
+        return {lang: self.view(mask) for lang, mask in
+                self.masks_by_language(languages, other, other_label,
+                                       year).items()}
+
+    def sort_by_year_and_language(self, languages=None, other=False,
+                                  other_label='default', years=None):
+        if years is None:
+            years = sorted(self.year_positions)
+        masks = self.masks_by_language(languages, other, other_label)
+        return OrderedDict(
+            (year, {lang: self.view(mask & self.year_bitset(year))
+                    for lang, mask in masks.items()})
+            for year in years)
+
+    def view(self, bitset):
+        return [self.book(position) for position in self.positions(bitset)]
+
+    def book(self, position):
+        book = self.views.get(position)
+        if book is None:
+            book = self.views[position] = self.create_book(position)
+        return book
+
+    def create_book(self, position):
+        seconds = self.dates[position]
+        if seconds == self.no_date:
+            date_read = self.other_dates.get(position, "")
+        else:
+            date_read = datetime.fromtimestamp(seconds, timezone(
+                timedelta(minutes=self.offsets[position])))
+        return self.book_type(
+            self.titles[self.title_ids[position]],
+            self.authors[self.author_ids[position]],
+            date_read,
+            self.shelf_sets[self.shelf_set_ids[position]],
+            date_read_estimated=bool(self.estimated[position]))
+
+
+class LanguageCounter():
+
+    # Same rules as BookArranger.sort_by_language, but only keeps count of
+    # the books, one at a time as they come in, rather than holding on to
+    # all of them.
+
+    def __init__(self, languages=None, other=False, other_label='default',
+                 year=None):
+        self.languages = languages or []
+        self.other = other
+        self.other_label = other_label
+        self.year = year
+        self.counts = {}
+        for lang in self.languages:
+            self.counts[lang] = 0
+        if other:
+            self.counts[other_label] = 0
+
+    def add(self, book):
+        if self.year is not None:
+            if getattr(book.date_read, 'year', None) != self.year:
+                return
+
+        self.add_shelves(book.shelves)
+
+    def add_shelves(self, shelves, count=1):
+        # For `count` books on the same shelves
+        for lang in self.languages:
+            if lang in shelves:
+                self.counts[lang] += count
+                break
+        else:
+            if self.other:
+                self.counts[self.other_label] += count
+
+    def add_all(self, books):
+        for book in books:
+            self.add(book)
+        return self.counts
+
+    def print_counts_nicely(self):
+        self.print_totals_nicely(self.counts)
+
+    @staticmethod
+    def print_totals_nicely(counts):
+        print("Books read based on Goodreads reviews")
+
+        for lang in sorted(counts.keys()):
+            print("%s: %d" % (lang, counts[lang]))
+
+    @staticmethod
+    def print_table_nicely(counts):
+        # One row per year, shelf or user, with the count for each language
+        print("Books read based on Goodreads reviews")
+
+        langs = sorted(set(lang for row in counts for lang in counts[row]))
+        label_width = max([len(str(row)) for row in counts] + [4])
+        widths = [max(len(lang), 3) for lang in langs]
+        print(" " * label_width + "".join(
+            "  %*s" % (width, lang) for width, lang in zip(widths, langs)))
+        for row in counts:
+            print("%-*s" % (label_width, row) + "".join(
+                "  %*d" % (width, counts[row].get(lang, 0))
+                for width, lang in zip(widths, langs)))
+
+
+class ShelfSetCounter():
+
+    # The number of books per year read and combination of shelves, which
+    # is all LanguageCounter needs to know to count the books for any
+    # languages. There are only ever a few dozen such combinations, so the
+    # counts are small enough to keep around between runs (see snapshot).
+
+    def __init__(self, counts=None):
+        # {year: {shelves: count}}, with None for the books without a date
+        self.counts = counts or {}
+
+    def add(self, book):
+        year = getattr(book.date_read, 'year', None)
+        shelf_sets = self.counts.setdefault(year, {})
+        shelf_sets[book.shelves] = shelf_sets.get(book.shelves, 0) + 1
+
+    def add_all(self, books):
+        for book in books:
+            self.add(book)
+        return self
+
+    def count_by_language(self, languages=None, other=False,
+                          other_label='default', year=None):
+        counter = LanguageCounter(languages, other, other_label)
+        years = self.counts if year is None else [year]
+        for each_year in years:
+            for shelves, count in self.counts.get(each_year, {}).items():
+                counter.add_shelves(shelves, count)
+        return counter.counts
+
+    def count_by_year_and_language(self, languages=None, other=False,
+                                   other_label='default', years=None):
+        if years is None:
+            years = sorted(year for year in self.counts if year is not None)
+        return OrderedDict(
+            (year, self.count_by_language(languages, other, other_label,
+                                          year))
+            for year in years)
+
+    # As a list of [year, shelves, count], which JSON can store
+    def to_entries(self):
+        return [[year, sorted(shelves), count]
+                for year, shelf_sets in self.counts.items()
+                for shelves, count in shelf_sets.items()]
+
+    @classmethod
+    def from_entries(cls, entries):
+        counter = cls()
+        for year, shelves, count in entries:
+            counter.counts.setdefault(year, {})[frozenset(shelves)] = count
+        return counter
@@ -0,0 +1,145 @@
+import csv
+import hashlib
+from datetime import datetime, timezone
+import logging
+import mmap
+import os
+
+
+# Sources of reviews other than the Goodreads API. They hand their reviews
+# over to the same parsing code as the API responses, one at a time, and
+# read the files through a memory map so that even large ones don't need
+# to fit in memory.
+
+def map_file(f):
+    # Empty files can't be mapped, but they don't have anything to read
+    # either
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def hash_files(filenames):
+    # Changes whenever any of the files does
+    digest = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            data = map_file(f)
+            if data is None:
+                continue
+            with data:
+                digest.update(data)
+    return digest.hexdigest()
+
+
+class XMLPagesSource():
+
+    # review/list responses saved from earlier runs, e.g. with
+    #   curl -o page1.xml 'https://www.goodreads.com/review/list/...'
+    # Each file is one page for the shelf being looked at, so every review
+    # they contain is on it. With a process pool, `jobs` files are parsed at
+    # the same time.
+
+    def __init__(self, filenames, jobs=1):
+        self.logger = logging.getLogger('data_sources')
+        self.filenames = filenames
+        self.jobs = jobs
+
+    def fingerprint(self):
+        return hash_files(self.filenames)
+
+    def iter_books(self, goodreads, shelf="read"):
+        if goodreads.pool is not None:
+            yield from goodreads.parse_pages(self.read_files(), self.jobs)
+            return
+
+        for filename in self.filenames:
+            self.logger.info("Reading reviews from %s", filename)
+            with open(filename, 'rb') as f:
+                data = map_file(f)
+                if data is None:
+                    continue
+                with data:
+                    yield from goodreads.parse_stream(
+                        data[start:start + goodreads.chunk_size]
+                        for start in range(0, len(data),
+                                           goodreads.chunk_size))
+
+    def read_files(self):
+        # Whole files, to send to the pool. They get copied over to the
+        # other process anyway, so there's nothing to gain from mapping them.
+        for filename in self.filenames:
+            self.logger.info("Reading reviews from %s", filename)
+            with open(filename, 'rb') as f:
+                content = f.read()
+            if content:
+                yield content
+
+
+class CSVExportSource():
+
+    # The library export from https://www.goodreads.com/review/import,
+    # one book per line. Rows are turned into reviews shaped like the ones
+    # xmltodict makes out of API responses.
+
+    date_format = '%Y/%m/%d'
+
+    def __init__(self, filename):
+        self.logger = logging.getLogger('data_sources')
+        self.filename = filename
+
+    def fingerprint(self):
+        return hash_files([self.filename])
+
+    def iter_books(self, goodreads, shelf="read"):
+        self.logger.info("Reading reviews from %s", self.filename)
+        with open(self.filename, 'rb') as f:
+            data = map_file(f)
+            if data is None:
+                return
+            with data:
+                # The export starts with a byte order mark, which utf-8-sig
+                # leaves out
+                rows = csv.DictReader(line.decode('utf-8-sig')
+                                      for line in iter(data.readline, b''))
+                for row in rows:
+                    if row.get('Exclusive Shelf') != shelf:
+                        continue
+                    yield goodreads.parse_review(
+                        self.to_review(row, goodreads.date_format))
+
+    def to_review(self, row, date_format):
+        authors = [row['Author']] + [
+            name.strip() for name in
+            (row.get('Additional Authors') or '').split(',') if name.strip()]
+        shelves = [row['Exclusive Shelf']] + [
+            name.strip() for name in
+            (row.get('Bookshelves') or '').split(',') if name.strip()]
+
+        review = {
+            'id': row['Book Id'],
+            'book': {
+                'title': row['Title'],
+                'authors': {'author': [{'name': name} for name in authors]},
+            },
+            'shelves': {'shelf': [{'@name': name} for name in shelves]},
+            # There's no updated date in the export, when the book was
+            # added is the next best thing to fall back on
+            'date_updated': self.convert_date(row.get('Date Added'),
+                                              date_format) or "",
+        }
+        date_read = self.convert_date(row.get('Date Read'), date_format)
+        if date_read is not None:
+            review['read_at'] = date_read
+        return review
+
+    def convert_date(self, value, date_format):
+        # The export only has days, which become midnight UTC in the API's
+        # date format
+        if not value:
+            return None
+        try:
+            date = datetime.strptime(value, self.date_format)
+        except ValueError:
+            return value
+        return date.replace(tzinfo=timezone.utc).strftime(date_format)
@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+
+
+class FetchJournal():
+
+    filename = '.fetch_journal'
+
+    # One JSON object per line: first what is being downloaded, then each
+    # page as soon as it's been parsed, with its books as review store
+    # records. Pages only ever get appended to the file, so an interrupted
+    # download leaves at worst half a line behind.
+
+    def __init__(self, filename=None, resume=False):
+        self.logger = logging.getLogger('fetch_journal')
+        if filename is not None:
+            self.filename = filename
+        self.resume = resume
+        self.file = None
+
+    def open(self, user_id, shelf, total, per_page):
+        # Returns the records for the pages downloaded last time, as long as
+        # the shelf hasn't changed since
+        header = {'user_id': user_id, 'shelf': shelf, 'total': total,
+                  'per_page': per_page}
+        pages = self.load(header) if self.resume else {}
+
+        if pages:
+            self.logger.info("Resuming download of %s, %s pages done",
+                             shelf, len(pages))
+
+        # Start a clean file either way, without any half-written line
+        self.file = open(self.filename, 'w')
+        self.write(header)
+        for page, records in sorted(pages.items()):
+            self.add(page, records)
+        return pages
+
+    def load(self, header):
+        pages = {}
+        try:
+            with open(self.filename, 'r') as f:
+                if json.loads(f.readline()) != header:
+                    self.logger.info("Journal is for another download, "
+                                     "starting again")
+                    return {}
+                for line in f:
+                    page = json.loads(line)
+                    pages[page['page']] = [tuple(record)
+                                           for record in page['records']]
+        except (OSError, ValueError, KeyError):
+            # Missing file, or the last line didn't get written completely
+            pass
+        return pages
+
+    def add(self, page, records):
+        self.write({'page': page, 'records': records})
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    def close(self, complete=True):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if complete:
+            os.remove(self.filename)
@@ -1,23 +1,118 @@
-from datetime import datetime
+from collections import Counter, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 import logging
+from sys import intern
+import threading
+import time
+from xml.etree.ElementTree import XMLPullParser
 
-import xmltodict
+
+# Goodreads dates always look like 'Fri Mar 04 00:00:00 -0800 2016', which
+# is a lot quicker to slice up than to hand over to strptime.
+DATE_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+MONTHS = {name: number for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+     'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+WEEKDAYS = frozenset(('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'))
+TIMEZONES = {}
+
+
+# A context manager that does nothing, for when nobody is timing anything
+NOT_TIMED = suppress()
+
+
+def parse_xml(content):
+    # xmltodict is only imported once there's something to parse, so that
+    # the commands that never get that far start quicker
+    import xmltodict
+    return xmltodict.parse(content)
+
+
+def parse_page(content):
+    # Parses a whole review/list response, for running in another process
+    # (see Goodreads.pool). Books pickle as plain tuples, and the problems
+    # with single reviews are sent back as counts for the main process to
+    # log.
+    goodreads = Goodreads(None)
+    goodreads.anomalies.counts = Counter()
+    reviews = parse_xml(content)[Goodreads.main_tag]['reviews']
+    books = goodreads.parse_reviews(reviews)
+    return (int(reviews['@end']), int(reviews['@total']), books,
+            dict(goodreads.anomalies.counts))
+
+
+def parse_date(value):
+    try:
+        if (len(value) == 30 and value[:3] in WEEKDAYS and
+                value[3] == value[7] == value[10] == ' ' and
+                value[19] == value[25] == ' ' and
+                value[13] == value[16] == ':' and value[20] in '+-' and
+                (value[8:10] + value[11:13] + value[14:16] + value[17:19] +
+                 value[21:25] + value[26:30]).isdigit()):
+            return datetime(int(value[26:30]), MONTHS[value[4:7]],
+                            int(value[8:10]), int(value[11:13]),
+                            int(value[14:16]), int(value[17:19]),
+                            tzinfo=parse_offset(value[20:25]))
+    except (KeyError, ValueError):
+        pass
+
+    # Anything unusual gets the slow but thorough treatment
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def parse_offset(offset):
+    tz = TIMEZONES.get(offset)
+    if tz is None:
+        minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+        if offset[0] == '-':
+            minutes = -minutes
+        tz = TIMEZONES.setdefault(offset, timezone(timedelta(minutes=minutes)))
+    return tz
 
 
 class Goodreads():
 
+    base_url = 'https://www.goodreads.com'
     main_tag = 'GoodreadsResponse'
-    date_format = '%a %b %d %H:%M:%S %z %Y'
+    date_format = DATE_FORMAT
+    chunk_size = 64 * 1024
+
+    # The most reviews the API will send in one go
+    max_per_page = 200
 
-    def __init__(self, session):
+    def __init__(self, session, streaming=False, per_page=max_per_page,
+                 source=None, stats=None, pool=None):
         self.logger = logging.getLogger('goodreads')
         self.session = session
+        # Where to read the reviews from instead of the API, e.g. saved
+        # pages or an export (see data_sources)
+        self.source = source
+        # profiling.Stats, to keep track of where the time goes
+        self.stats = stats
+        # A concurrent.futures.ProcessPoolExecutor to parse the pages in,
+        # so that parsing isn't limited to one core. Streamed pages are
+        # parsed as they come in, and don't use it.
+        self.pool = pool
+        # Problems with single reviews, for the page being parsed in each
+        # thread, see anomaly()
+        self.anomalies = threading.local()
+        self.streaming = streaming
+        self.per_page = per_page
+        # Pages parsed by autotune_per_page, by (shelf, page, per_page), for
+        # retrieve_page not to download them again
+        self.prefetched = {}
         self.user = None
         self.user_id = None
         self.books = []
 
     def initialise_user(self):
-        self.user = self.get_authenticated_user()
+        self.set_user(self.get_authenticated_user())
+
+    def set_user(self, user):
+        self.user = user
         try:
             self.user_id = self.user['@id']
         except KeyError:
@@ -26,76 +121,509 @@ class Goodreads():
             exit(msg)
 
     def get_authenticated_user(self):
-        url = "https://www.goodreads.com/api/auth_user"
+        url = "%s/api/auth_user" % self.base_url
         self.logger.info("Getting user info at %s" % url)
+        return self.read_user(url, self.get(url))
 
-        response = self.session.get(url)
+    def read_user(self, url, response):
         try:
-            return xmltodict.parse(response.content)[self.main_tag]['user']
+            with self.timer('xml parsing'):
+                return parse_xml(response.content)[self.main_tag]['user']
         except Exception:
             msg = "Couldn't get the user info (%s). Status code: %s"
             self.logger.exception(msg, url, response.status_code)
             exit(msg % (url, response.status_code))
 
+    def download_reviews(self, shelf="read", page=1):
+        url, data = self.reviews_request(shelf, page)
+        response = self.post(url, data)
+        self.logger.info("Getting reviews (%s, page %s): %s",
+                         url, page, response.status_code)
+        self.count('bytes', len(response.content))
+        return response.content
+
     def retrieve_reviews(self, shelf="read", page=1):
+        content = self.download_reviews(shelf, page)
+        with self.timer('xml parsing'):
+            return parse_xml(content)[self.main_tag]['reviews']
+
+    def stream_reviews(self, shelf="read", page=1):
+        url, data = self.reviews_request(shelf, page)
+        response = self.post(url, data, stream=True)
+        self.logger.info("Streaming reviews (%s, page %s): %s",
+                         url, page, response.status_code)
+        return self.parse_stream(response.iter_content(self.chunk_size))
+
+    def parse_stream(self, chunks):
+        return ReviewStream(self, chunks)
+
+    def get(self, url, *args, **kwargs):
+        self.count('requests')
+        with self.timer('network'):
+            return self.session.get(url, *args, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        # Streamed responses are mostly downloaded while they're parsed, see
+        # ReviewStream.feed
+        self.count('requests')
+        with self.timer('network'):
+            return self.session.post(url, *args, **kwargs)
+
+    # Anomalies that mean something went wrong, rather than e.g. a review
+    # without a read date
+    failures = frozenset(('unparsed read date', 'unparsed updated date',
+                          'unparsed author', 'unparsed shelves'))
+
+    def anomaly(self, kind, review_id, exc_info=False):
+        # Called for every review, so the details are only logged when
+        # debugging. Otherwise log_anomalies sums them up once per page.
+        counts = getattr(self.anomalies, 'counts', None)
+        if counts is None:
+            counts = self.anomalies.counts = Counter()
+        counts[kind] += 1
+        if kind in self.failures:
+            self.count('parse failures')
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s (review %s)", kind.capitalize(), review_id,
+                              exc_info=exc_info)
+
+    def add_anomalies(self, anomalies):
+        # Counts from parse_page, as if the reviews had been parsed here
+        counts = getattr(self.anomalies, 'counts', None)
+        if counts is None:
+            counts = self.anomalies.counts = Counter()
+        counts.update(anomalies)
+        failures = sum(count for kind, count in anomalies.items()
+                       if kind in self.failures)
+        if failures:
+            self.count('parse failures', failures)
+
+    def log_anomalies(self, where):
+        counts = getattr(self.anomalies, 'counts', None)
+        self.anomalies.counts = Counter()
+        if not counts:
+            return
+        failed = any(kind in self.failures for kind in counts)
+        self.logger.log(logging.WARNING if failed else logging.INFO,
+                        "Reviews on %s: %s", where, ", ".join(
+                            "%s %s" % (count, kind)
+                            for kind, count in sorted(counts.items())))
+
+    def timer(self, name):
+        if self.stats is None:
+            return NOT_TIMED
+        return self.stats.timer(name)
+
+    def count(self, name, amount=1):
+        if self.stats is not None:
+            self.stats.count(name, amount)
+
+    def reviews_request(self, shelf, page):
         data = {'id': self.user_id,
                 'v': '2',
                 'page': page,
                 'shelf': shelf,
-                'sort': 'date_read'}
+                'sort': 'date_read',
+                'order': 'd',
+                'per_page': self.per_page}
+
+        url = '%s/review/list/%s.xml' % (self.base_url, self.user_id)
+        return url, data
+
+    def retrieve_page(self, shelf="read", page=1):
+        # Returns the last review number on the page, the total number of
+        # reviews and the books on the page
+        self.anomalies.counts = Counter()
+        prefetched = self.prefetched.pop((shelf, page, self.per_page), None)
+        if prefetched is not None:
+            end, total, books, self.anomalies.counts = prefetched
+        elif self.streaming:
+            reviews = self.stream_reviews(shelf, page)
+            end, total = reviews.read_counts()
+            books = list(reviews)
+        elif self.pool is not None:
+            content = self.download_reviews(shelf, page)
+            end, total, books = self.parse_in_pool(content)
+        else:
+            reviews = self.retrieve_reviews(shelf, page)
+            end, total = int(reviews['@end']), int(reviews['@total'])
+            books = self.parse_reviews(reviews)
+        self.log_anomalies("page %s of %s" % (page, shelf))
+        return end, total, books
+
+    def parse_in_pool(self, content):
+        with self.timer('parsing in pool'):
+            end, total, books, anomalies = self.pool.submit(
+                parse_page, content).result()
+        self.count('reviews parsed', len(books))
+        self.add_anomalies(anomalies)
+        return end, total, books
+
+    def parse_pages(self, contents, jobs=1):
+        # Parses whole pages in the pool, up to `jobs` of them at the same
+        # time, and hands their books back in the same order as the pages
+        contents = iter(contents)
+        futures = deque(self.pool.submit(parse_page, content)
+                        for content in islice(contents, jobs))
+        while futures:
+            with self.timer('parsing in pool'):
+                _, _, books, anomalies = futures.popleft().result()
+            for content in islice(contents, 1):
+                futures.append(self.pool.submit(parse_page, content))
+            self.count('reviews parsed', len(books))
+            self.add_anomalies(anomalies)
+            yield from books
+
+    def get_books(self, shelf="read", jobs=1, store=None, journal=None,
+                  year=None):
+        self.books.extend(self.iter_books(shelf, jobs, store, journal, year))
+        return self.books
+
+    def get_books_by_shelf(self, shelves, jobs=1, store=None, journals=None,
+                           year=None):
+        # Each shelf gets downloaded in its own thread, all of them through
+        # the same session. Books that show up on more than one shelf, for
+        # instance because they were moved in the meantime, only count for
+        # the first one.
+        journals = journals or {}
+        with ThreadPoolExecutor(max_workers=len(shelves)) as executor:
+            futures = [executor.submit(list, self.iter_books(
+                shelf, jobs, store, journals.get(shelf), year))
+                for shelf in shelves]
+            results = [future.result() for future in futures]
+        return self.merge_shelves(shelves, results)
+
+    def merge_shelves(self, shelves, results):
+        books_by_shelf = OrderedDict()
+        seen = set()
+        for shelf, books in zip(shelves, results):
+            books_by_shelf[shelf] = []
+            for book in books:
+                if book.review_id is not None:
+                    if book.review_id in seen:
+                        continue
+                    seen.add(book.review_id)
+                books_by_shelf[shelf].append(book)
+            self.books.extend(books_by_shelf[shelf])
+
+        return books_by_shelf
+
+    def iter_books(self, shelf="read", jobs=1, store=None, journal=None,
+                   year=None, sync=True):
+        # Hands out the books one page at a time, as soon as each page has
+        # been parsed. If only the books read since a given year are needed,
+        # the download stops at the first page of books read before that.
+        # `sync=False` when sync_books already found the store out of date.
+        if self.source is not None:
+            # Local files are quick enough to read in full every time
+            yield from self.source.iter_books(self, shelf)
+            self.log_anomalies(shelf)
+            return
+
+        if store is not None and sync and self.sync_books(shelf, store):
+            for record in store.load(shelf):
+                yield Book.from_record(record)
+            return
+
+        # The first page tells us how many reviews there are per page and in
+        # total, after which the remaining pages can be requested in any order
+        end, total, books = self.retrieve_page(shelf, 1)
+        pages = self.count_pages(end, total)
+        self.logger.debug("Parsed page 1 of %s (until review #%s, total %s, "
+                          "%s per page)", pages, end, total, self.per_page)
+
+        done = {}
+        if journal is not None:
+            done = journal.open(self.user_id, shelf, total, end)
+            if 1 not in done:
+                journal.add(1, [book.to_record() for book in books])
+        # With a year, the download may stop before the older pages and
+        # the store has to keep what it had rather than part of the shelf:
+        # it's only replaced once every page has been seen.
+        stored = None
+        if store is not None and year is not None:
+            stored = [book.to_record() for book in books]
+        elif store is not None:
+            # If this gets interrupted, the next sync will notice the store
+            # doesn't have all the reviews and start over
+            store.clear(shelf)
+            store.append(shelf, [book.to_record() for book in books])
+        yield from books
+
+        last_page = 1
+        if not self.read_before(books, year):
+            missing = [page for page in range(2, pages + 1)
+                       if page not in done]
+            downloads = self.retrieve_pages(shelf, missing, jobs)
+            fetched = zip(missing, downloads)
+            for last_page in range(2, pages + 1):
+                if last_page in done:
+                    books = [Book.from_record(record)
+                             for record in done[last_page]]
+                else:
+                    _, (end, total, books) = next(fetched)
+                    self.logger.debug("Parsed page %s of %s (until review "
+                                      "#%s, total %s, %s per page)",
+                                      last_page, pages, end, total,
+                                      self.per_page)
+                    if journal is not None:
+                        journal.add(last_page,
+                                    [book.to_record() for book in books])
+
+                if stored is not None:
+                    stored.extend(book.to_record() for book in books)
+                elif store is not None:
+                    store.append(shelf, [book.to_record() for book in books])
+                yield from books
+
+                if self.read_before(books, year):
+                    break
+            # Don't wait for pages we won't need
+            downloads.close()
+
+        if last_page < pages:
+            self.logger.info("Stopped at page %s of %s, everything after "
+                             "was read before %s", last_page, pages, year)
+            yield from self.get_undated_books(shelf, last_page, pages)
+        elif stored is not None:
+            store.replace(shelf, stored)
+
+        if journal is not None:
+            journal.close()
 
-        url = 'https://www.goodreads.com/review/list/%s.xml' % self.user_id
-        response = self.session.post(url, data)
+    # The same downloads with an async session (see async_session), from a
+    # single thread. Every page is requested at once, and the session's
+    # rate limit decides how quickly they actually go out. There's no store
+    # or journal, everything gets downloaded every time.
+
+    async def initialise_user_async(self):
+        url = "%s/api/auth_user" % self.base_url
+        self.logger.info("Getting user info at %s" % url)
+        self.count('requests')
+        with self.timer('network'):
+            response = await self.session.get(url)
+        self.set_user(self.read_user(url, response))
+
+    async def retrieve_page_async(self, shelf="read", page=1):
+        url, data = self.reviews_request(shelf, page)
+        self.count('requests')
+        with self.timer('network'):
+            response = await self.session.post(url, data)
         self.logger.info("Getting reviews (%s, page %s): %s",
                          url, page, response.status_code)
-        return xmltodict.parse(response.content)[self.main_tag]['reviews']
+        self.count('bytes', len(response.content))
 
-    def get_books(self, shelf="read"):
-        page, end, total = 0, 0, 1
+        if self.pool is not None:
+            # The other downloads carry on while the page is parsed
+            import asyncio
+            with self.timer('parsing in pool'):
+                end, total, books, anomalies = \
+                    await asyncio.get_event_loop().run_in_executor(
+                        self.pool, parse_page, response.content)
+            self.count('reviews parsed', len(books))
+            self.anomalies.counts = Counter()
+            self.add_anomalies(anomalies)
+            self.log_anomalies("page %s of %s" % (page, shelf))
+            return end, total, books
 
+        # Nothing else runs on the thread until the page is parsed, so the
+        # anomalies don't get mixed up with another page's
+        self.anomalies.counts = Counter()
+        with self.timer('xml parsing'):
+            reviews = parse_xml(response.content)[self.main_tag]['reviews']
+        books = self.parse_reviews(reviews)
+        self.log_anomalies("page %s of %s" % (page, shelf))
+        return int(reviews['@end']), int(reviews['@total']), books
+
+    async def retrieve_shelf_async(self, shelf="read"):
+        # asyncio takes a while to import, and nothing else needs it
+        import asyncio
+        if self.user_id is None:
+            await self.initialise_user_async()
+        end, total, books = await self.retrieve_page_async(shelf, 1)
+        pages = await asyncio.gather(*(
+            self.retrieve_page_async(shelf, page)
+            for page in range(2, self.count_pages(end, total) + 1)))
+        for _, _, page_books in pages:
+            books.extend(page_books)
+        return books
+
+    async def get_books_async(self, shelf="read"):
+        self.books.extend(await self.retrieve_shelf_async(shelf))
+        return self.books
+
+    async def get_books_by_shelf_async(self, shelves):
+        import asyncio
+        if self.user_id is None:
+            await self.initialise_user_async()
+        results = await asyncio.gather(*(self.retrieve_shelf_async(shelf)
+                                         for shelf in shelves))
+        return self.merge_shelves(shelves, results)
+
+    @staticmethod
+    def read_before(books, year):
+        # Books without a read date don't say anything about where we are
+        if year is None or not books:
+            return False
+        return all(isinstance(book.date_read, datetime) and
+                   not book.date_read_estimated and book.date_read.year < year
+                   for book in books)
+
+    def get_undated_books(self, shelf, last_page, pages):
+        # Depending on how Goodreads sorts them, the books without a read
+        # date may also be at the very end of the list. Go back from the
+        # last page until there aren't any of them left.
+        undated = []
+        for page in range(pages, last_page, -1):
+            _, _, books = self.retrieve_page(shelf, page)
+            undated.insert(0, [book for book in books
+                               if book.date_read_estimated])
+            if len(undated[0]) < len(books):
+                break
+        return [book for books in undated for book in books]
+
+    def sync_books(self, shelf, store):
+        # Returns whether the store is now up to date with Goodreads. Reviews
+        # are sorted by date read, so once we get to a review the store
+        # already knows about everything after it should be known as well.
+        if not store.count(shelf):
+            return False
+
+        books = []
+        page, end, total = 0, 0, 1
         while end < total:
             page += 1
-            reviews = self.retrieve_reviews(shelf, page)
-            end = int(reviews['@end'])
-            total = int(reviews['@total'])
-            self.logger.debug("Parsing page %s (until review #%s, total %s)",
+            end, total, new_books = self.retrieve_page(shelf, page)
+            self.logger.debug("Synced page %s (until review #%s, total %s)",
                               page, end, total)
+            books.extend(new_books)
+            if any(store.is_current(book.review_id, book.date_updated)
+                   for book in new_books):
+                break
 
-            # Make sure the reviews are iterable, even if only one is returned
-            if type(reviews['review']) == list:
-                reviews = reviews['review']
-            else:
-                reviews = [reviews['review']]
+        store.prepend(shelf, [book.to_record() for book in books])
 
-            for review in reviews:
-                self.logger.debug("Parsing review %s", review['id'])
-                title = review['book']['title']
-                date_read = self.parse_date_read(review, title)
-                author = self.parse_author(review)
-                shelves = self.parse_shelves(review)
+        # Reviews that were deleted or edited further down the list don't
+        # show up at the top, but deletions at least change the total
+        if store.count(shelf) != total:
+            self.logger.info("Stored reviews for %s don't match the total "
+                             "(%s), downloading everything again",
+                             shelf, total)
+            return False
+        return True
 
-                book = Book(title, author, date_read, shelves)
-                self.books.append(book)
+    def autotune_per_page(self, shelf="read", sizes=(200, 100, 50, 20)):
+        # Requests the first page with each number of reviews per page, and
+        # keeps the one that would get through the whole shelf the quickest.
+        # Waiting for the rate limit counts as part of the request, as it's
+        # what makes lots of small pages expensive. A cached response would
+        # say nothing about the network, so the cache is left out.
+        best = None
+        probes = {}
+        for size in sizes:
+            self.per_page = size
+            url, data = self.reviews_request(shelf, 1)
+            self.anomalies.counts = Counter()
+            start = time.perf_counter()
+            response = self.session.post(url, data, cached=False)
+            fetched = time.perf_counter()
+            reviews = parse_xml(response.content)[self.main_tag]
+            reviews = reviews['reviews']
+            books = self.parse_reviews(reviews)
+            parsed = time.perf_counter()
 
-        return self.books
+            end, total = int(reviews['@end']), int(reviews['@total'])
+            probes[size] = (end, total, books, self.anomalies.counts)
+            estimate = (self.count_pages(end, total) * (fetched - start) +
+                        (parsed - fetched) * total / max(len(books), 1))
+            self.logger.debug("%s per page: %.3fs per request, %.3fs to "
+                              "parse, %.1fs estimated in total", size,
+                              fetched - start, parsed - fetched, estimate)
+            if best is None or estimate < best[0]:
+                best = (estimate, size)
+            # Everything fits on one page, smaller pages won't do better
+            if end >= total:
+                break
+
+        self.per_page = best[1]
+        self.anomalies.counts = Counter()
+        # The first page with that size is already here
+        self.prefetched[(shelf, 1, self.per_page)] = probes[self.per_page]
+        self.logger.info("Using %s reviews per page", self.per_page)
+        return self.per_page
+
+    @staticmethod
+    def count_pages(end, total):
+        # 'end' on the first page is also the number of reviews per page
+        if end <= 0:
+            return 1
+        return (total + end - 1) // end
+
+    def retrieve_pages(self, shelf, pages, jobs=1):
+        if jobs <= 1:
+            for page in pages:
+                yield self.retrieve_page(shelf, page)
+            return
+
+        # Pages are handed back in order, which keeps the books sorted by
+        # date read, each as soon as it and the ones before it are ready. At
+        # most `jobs` pages are requested ahead, so that stopping early
+        # doesn't leave many downloads behind.
+        pages = iter(pages)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = deque(executor.submit(self.retrieve_page, shelf, page)
+                            for page in islice(pages, jobs))
+            while futures:
+                result = futures.popleft().result()
+                for page in islice(pages, 1):
+                    futures.append(
+                        executor.submit(self.retrieve_page, shelf, page))
+                yield result
+
+    def parse_reviews(self, reviews):
+        # Make sure the reviews are iterable, even if only one is returned
+        if 'review' not in reviews or reviews['review'] is None:
+            return []
+        elif type(reviews['review']) == list:
+            reviews = reviews['review']
+        else:
+            reviews = [reviews['review']]
+
+        return [self.parse_review(review) for review in reviews]
+
+    def parse_review(self, review):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Parsing review %s", review['id'])
+        self.count('reviews parsed')
+        title = review['book']['title']
+        with self.timer('parse_date_read'):
+            date_read = self.parse_date_read(review, title)
+        with self.timer('parse_author'):
+            author = self.parse_author(review)
+        with self.timer('parse_shelves'):
+            shelves = self.parse_shelves(review)
+
+        return Book(title, author, date_read, shelves,
+                    review_id=review['id'],
+                    date_updated=review.get('date_updated'),
+                    date_read_estimated=self.is_estimated(review, date_read))
 
     def parse_date_read(self, review, title):
         try:
-            date_read = datetime.strptime(review['read_at'],
-                                          self.date_format)
+            # Empty dates come out of xmltodict as None
+            if not review['read_at']:
+                raise KeyError('read_at')
+            date_read = parse_date(review['read_at'])
 
         except KeyError:
             date_read = ""
-            self.logger.info("Date read is missing (review %s for %s)",
-                             review['id'], title)
+            self.anomaly('missing read date', review['id'])
         except ValueError:
             date_read = review['read_at']
-            self.logger.debug("Failed to parse date %s (review %s for %s)",
-                              date_read, review['id'], title)
+            self.anomaly('unparsed read date', review['id'])
         except Exception:
             date_read = ""
-            self.logger.exception("Failed to parse date for review %s (%s)",
-                                  review['id'], title)
+            self.anomaly('unparsed read date', review['id'], exc_info=True)
 
         # We're only looking at the 'read' shelf so everything in here should
         # have been read. If there is no date, it could be that the user didn't
@@ -103,20 +631,18 @@ class Goodreads():
         # instead.
         if date_read == "":
             try:
-                date_read = datetime.strptime(review['date_updated'],
-                                              self.date_format)
-                self.logger.info(
-                    "Using 'date updated' as backup for 'date read' "
-                    "for %s (%s)", title, date_read
-                )
-            except ValueError:
-                self.logger.exception(
-                    "Failed to parse 'date_updated' date (%s) for review "
-                    "%s (%s)", review['date_updated'], review['id'], title
-                )
+                date_read = parse_date(review['date_updated'])
+            except (KeyError, TypeError, ValueError):
+                self.anomaly('unparsed updated date', review['id'],
+                             exc_info=True)
 
         return date_read
 
+    @staticmethod
+    def is_estimated(review, date_read):
+        # Whether parse_date_read had to fall back on the updated date
+        return not review.get('read_at') and isinstance(date_read, datetime)
+
     def parse_author(self, review):
         try:
             if type(review['book']['authors']['author']) == list:
@@ -127,8 +653,7 @@ class Goodreads():
                 author = review['book']['authors']['author']['name']
         except Exception:
             author = ""
-            self.logger.exception("Failed to parse author(s) for review %s",
-                                  review['id'])
+            self.anomaly('unparsed author', review['id'], exc_info=True)
         return author
 
     def parse_shelves(self, review):
@@ -140,21 +665,157 @@ class Goodreads():
                 shelves = [review['shelves']['shelf']['@name']]
         except Exception:
             shelves = []
-            self.logger.exception("Failed to parse shelves for review %s",
-                                  review['id'])
+            self.anomaly('unparsed shelves', review['id'], exc_info=True)
         return shelves
 
+    def parse_review_element(self, element):
+        # Same as parse_reviews, for a <review> from the streaming parser.
+        # parse_date_read only needs a few fields, so pass it just those in
+        # the shape xmltodict would have used.
+        self.count('reviews parsed')
+        review = {}
+        for tag in ('id', 'read_at', 'date_updated'):
+            child = element.find(tag)
+            if child is not None:
+                review[tag] = (child.text or "").strip() or None
+
+        title = element.findtext('book/title')
+        with self.timer('parse_date_read'):
+            date_read = self.parse_date_read(review, title)
+
+        with self.timer('parse_author'):
+            names = [author.findtext('name')
+                     for author in element.iterfind('book/authors/author')]
+            if names and None not in names:
+                author = ', '.join(names)
+            else:
+                author = ""
+                self.anomaly('unparsed author', review.get('id'))
+
+        with self.timer('parse_shelves'):
+            shelves = [shelf.get('name')
+                       for shelf in element.iterfind('shelves/shelf')
+                       if shelf.get('name') is not None]
+
+        return Book(title, author, date_read, shelves,
+                    review_id=review.get('id'),
+                    date_updated=review.get('date_updated'),
+                    date_read_estimated=self.is_estimated(review, date_read))
+
+
+class ReviewStream():
+
+    # Parses a review/list response while it is being downloaded, handing
+    # out each book as soon as its <review> element is complete. Parsed
+    # elements are dropped straight away, so memory use doesn't depend on
+    # the number of reviews per page.
+
+    def __init__(self, goodreads, chunks):
+        self.goodreads = goodreads
+        self.chunks = iter(chunks)
+        self.parser = XMLPullParser(events=('start', 'end'))
+        self.reviews = None
+        self.pending = deque()
+
+    def read_counts(self):
+        while self.reviews is None:
+            if not self.feed():
+                raise ValueError("No reviews found in the response")
+        return int(self.reviews.get('end')), int(self.reviews.get('total'))
+
+    def feed(self):
+        with self.goodreads.timer('network'):
+            chunk = next(self.chunks, None)
+        if chunk is None:
+            self.parser.close()
+            return False
+
+        self.goodreads.count('bytes', len(chunk))
+        with self.goodreads.timer('xml parsing'):
+            self.parser.feed(chunk)
+            events = list(self.parser.read_events())
+        for event, element in events:
+            if event == 'start':
+                if element.tag == 'reviews' and self.reviews is None:
+                    self.reviews = element
+            elif element.tag == 'review' and self.reviews is not None:
+                self.pending.append(element)
+        return True
+
+    def __iter__(self):
+        while True:
+            while self.pending:
+                element = self.pending.popleft()
+                book = self.goodreads.parse_review_element(element)
+                element.clear()
+                self.reviews.remove(element)
+                yield book
+            if not self.feed():
+                return
+
 
 class Book():
 
-    def __init__(self, title, author, date_read=None, shelves=None):
+    __slots__ = ('title', 'author', 'date_read', 'shelves', 'review_id',
+                 'date_updated', 'date_read_estimated')
+
+    # Most books are on one of a handful of shelf combinations (e.g. read
+    # and fr), so all the books share a single copy of each combination.
+    shelf_sets = {}
+
+    def __init__(self, title, author, date_read=None, shelves=None,
+                 review_id=None, date_updated=None,
+                 date_read_estimated=False):
         self.title = title
         self.author = author
         self.date_read = date_read
+        self.shelves = self.intern_shelves(shelves)
+        self.review_id = review_id
+        self.date_updated = date_updated
+        # The book had no read date, date_read is when it was last updated
+        self.date_read_estimated = date_read_estimated
+
+    @classmethod
+    def intern_shelves(cls, shelves):
         if shelves is None:
-            self.shelves = []
-        else:
-            self.shelves = shelves
+            shelves = ()
+        shelves = frozenset(intern(shelf) for shelf in shelves)
+        return cls.shelf_sets.setdefault(shelves, shelves)
 
     def __repr__(self):
         return "Book(%s, by %s)" % (self.title, self.author)
+
+    def __reduce__(self):
+        # Pickled as the arguments to rebuild the book with, which is a lot
+        # smaller than the slots by name, e.g. when sent back by parse_page
+        return (self.__class__, (self.title, self.author, self.date_read,
+                                 tuple(self.shelves), self.review_id,
+                                 self.date_updated, self.date_read_estimated))
+
+    # Records are plain tuples of strings, the way the review store keeps
+    # them. Dates are kept in the Goodreads format, and estimated read
+    # dates are left out like they were in the review.
+    def to_record(self):
+        date_read = self.date_read
+        if self.date_read_estimated:
+            date_read = ""
+        elif isinstance(date_read, datetime):
+            date_read = date_read.strftime(DATE_FORMAT)
+        return (self.review_id, self.title, self.author, date_read or "",
+                self.date_updated, sorted(self.shelves))
+
+    @classmethod
+    def from_record(cls, record):
+        review_id, title, author, date_read, date_updated, shelves = record
+        estimated = False
+        try:
+            if date_read:
+                date_read = parse_date(date_read)
+            elif date_updated:
+                date_read = parse_date(date_updated)
+                estimated = True
+        except (TypeError, ValueError):
+            pass
+        return cls(title, author, date_read, shelves,
+                   review_id=review_id, date_updated=date_updated,
+                   date_read_estimated=estimated)
@@ -1,21 +1,62 @@
+from functools import partial
 import logging
 import os
+import socket
 
 from rauth.service import OAuth1Service
 from rauth.session import OAuth1Session
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+class KeepAliveAdapter(HTTPAdapter):
+
+    # Ask the OS to keep idle connections alive between two pages, so the
+    # pool doesn't end up handing out connections the server dropped
+    socket_options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault('socket_options', self.socket_options)
+        super().init_poolmanager(*args, **kwargs)
+
+    def connection_stats(self):
+        requests, connections = 0, 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests += pool.num_requests
+                connections += pool.num_connections
+        return {'requests': requests,
+                'new_connections': connections,
+                'reused_connections': requests - connections}
 
 
 class GoodreadsSession():
 
     session = None
     filename = '.access_token'
+    # Only retry failures to connect, POSTs aren't safe to send twice
+    max_retries = 2
+    headers = {'Accept-Encoding': 'gzip, deflate',
+               'Connection': 'keep-alive'}
 
-    def __init__(self, api_key, api_secret):
+    def __init__(self, api_key, api_secret, cache=None, pool_size=10,
+                 scheduler=None, filename=None):
         self.logger = logging.getLogger('goodreads_session')
+        # Each user of a batch has their own access token file
+        if filename is not None:
+            self.filename = filename
         self.api_key = api_key
         self.api_secret = api_secret
         self.access_token = None
         self.access_token_secret = None
+        self.cache = cache
+        # At least as many connections as pages fetched at the same time
+        self.pool_size = pool_size
+        self.adapter = None
+        self.scheduler = scheduler
 
     def set_session(self):
         # Did we save the access tokens last time?
@@ -59,6 +100,7 @@ class GoodreadsSession():
             self.access_token = session.access_token
             self.access_token_secret = session.access_token_secret
             self.session = session
+        self.configure_session()
 
     def reopen_session(self):
         self.session = OAuth1Session(
@@ -66,13 +108,39 @@ class GoodreadsSession():
             consumer_secret=self.api_secret,
             access_token=self.access_token,
             access_token_secret=self.access_token_secret)
+        self.configure_session()
+
+    def configure_session(self):
+        self.adapter = KeepAliveAdapter(pool_connections=1,
+                                        pool_maxsize=self.pool_size,
+                                        max_retries=self.max_retries)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.session.headers.update(self.headers)
+
+    def connection_stats(self):
+        if self.adapter is None:
+            return {'requests': 0, 'new_connections': 0,
+                    'reused_connections': 0}
+        return self.adapter.connection_stats()
 
     def get(self, *args, **kwargs):
-        if self.session is None:
-            self.set_session()
-        return self.session.get(*args, **kwargs)
+        return self.request('get', *args, **kwargs)
 
     def post(self, *args, **kwargs):
+        return self.request('post', *args, **kwargs)
+
+    def request(self, method, url, *args, cached=True, **kwargs):
+        # `cached=False` always talks to Goodreads, e.g. to time the request
         if self.session is None:
             self.set_session()
-        return self.session.post(*args, **kwargs)
+        send = getattr(self.session, method)
+        # Cached responses don't count towards the rate limit
+        if self.scheduler is not None:
+            send = partial(self.scheduler.send, send)
+        if self.cache is None or not cached:
+            return send(url, *args, **kwargs)
+
+        # Responses depend on who is asking, so keep them apart per user
+        return self.cache.fetch(send, method, url, *args,
+                                namespace=self.access_token, **kwargs)
@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+class CachedResponse():
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class ResponseCache():
+
+    directory = '.rattle_cache'
+    max_size = 50 * 1024 * 1024
+
+    # How long responses stay fresh, in seconds, for URLs containing these.
+    # Who the user is won't change any time soon, their reviews might.
+    ttls = (('/api/auth_user', 24 * 60 * 60),
+            ('/review/list/', 5 * 60))
+    default_ttl = 0
+
+    # Only these are worth keeping for revalidation
+    validators = ('ETag', 'Last-Modified')
+
+    def __init__(self, directory=None, max_size=None, ttls=None,
+                 refresh=False):
+        self.logger = logging.getLogger('http_cache')
+        if directory is not None:
+            self.directory = directory
+        if max_size is not None:
+            self.max_size = max_size
+        if ttls is not None:
+            self.ttls = ttls
+        # Refreshing skips the lookups, but still saves the new responses
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def ttl(self, url):
+        for fragment, ttl in self.ttls:
+            if fragment in url:
+                return ttl
+        return self.default_ttl
+
+    def key(self, namespace, method, url, args, kwargs):
+        # Streaming or not, the response is the same
+        kwargs = {name: value for name, value in kwargs.items()
+                  if name not in ('stream', 'headers')}
+        request = json.dumps([namespace, method, url, args, kwargs],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(request.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def fetch(self, send, method, url, *args, namespace=None, **kwargs):
+        key = self.key(namespace, method, url, args, kwargs)
+        entry = None if self.refresh else self.load(key)
+
+        if entry is not None:
+            if time.time() - entry['stored'] < self.ttl(url):
+                self.hits += 1
+                self.logger.debug("Cache hit for %s", url)
+                return self.to_response(entry)
+
+            # Stale, but the server may be able to tell us it's still good
+            validators = entry['headers']
+            headers = dict(kwargs.pop('headers', None) or {})
+            if 'ETag' in validators:
+                headers['If-None-Match'] = validators['ETag']
+            if 'Last-Modified' in validators:
+                headers['If-Modified-Since'] = validators['Last-Modified']
+            if headers:
+                kwargs['headers'] = headers
+
+        response = send(url, *args, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            self.revalidated += 1
+            self.logger.debug("Cached response for %s is still valid", url)
+            entry['stored'] = time.time()
+            self.save(key, entry)
+            return self.to_response(entry)
+
+        self.misses += 1
+        if response.status_code == 200:
+            self.save(key, {
+                'url': url,
+                'stored': time.time(),
+                'status_code': response.status_code,
+                'headers': {name: response.headers[name]
+                            for name in self.validators
+                            if name in response.headers},
+                'content': base64.b64encode(
+                    response.content).decode('ascii')})
+        return response
+
+    def to_response(self, entry):
+        return CachedResponse(entry['status_code'], entry['headers'],
+                              base64.b64decode(entry['content']))
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            # The modification time doubles as the last time it was used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def save(self, key, entry):
+        path = self.path(key)
+        temporary = '%s.%s.%s.tmp' % (path, os.getpid(),
+                                      threading.get_ident())
+        try:
+            with open(temporary, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temporary, path)
+        except OSError:
+            self.logger.exception("Couldn't save the response for %s",
+                                  entry['url'])
+            return
+        self.evict()
+
+    def evict(self):
+        # Drop the least recently used responses until we fit again
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            self.logger.debug("Evicted %s from the cache", path)
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import sys
+import threading
+import time
+
+
+class Stats():
+
+    # Timers and counters for the different stages of a run. Timers add up
+    # the wall clock time spent in each stage, across threads, so stages
+    # running in parallel can add up to more than the whole run.
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.timers = OrderedDict()
+        self.counters = OrderedDict()
+
+    @contextmanager
+    def timer(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add_time(name, self.clock() - start)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            total, calls = self.timers.get(name, (0.0, 0))
+            self.timers[name] = (total + seconds, calls + 1)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        with self.lock:
+            return {
+                'timers': OrderedDict(
+                    (name, {'seconds': seconds, 'calls': calls})
+                    for name, (seconds, calls) in self.timers.items()),
+                'counters': OrderedDict(self.counters),
+            }
+
+    def print_summary(self, file=sys.stderr):
+        report = self.report()
+        print("Profile", file=file)
+        for name, timer in report['timers'].items():
+            print("  %-25s %10.3fs %10d calls" % (
+                name, timer['seconds'], timer['calls']), file=file)
+        for name, count in report['counters'].items():
+            print("  %-25s %11d" % (name, count), file=file)
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2)
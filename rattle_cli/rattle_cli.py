@@ -1,36 +1,435 @@
 import argparse
+from contextlib import suppress
 import logging
 
-from bookarranger import BookArranger
-from goodreads import Goodreads
-from goodreads_session import GoodreadsSession
-try:
-    from secrets import api_key, api_secret
-except Exception:
-    exit("No API key/secret found.")
+from collections import OrderedDict
+
+from bookarranger import (BookArranger, ColumnarBookArranger,
+                          LanguageCounter, ShelfSetCounter)
+from fetch_journal import FetchJournal
+from http_cache import ResponseCache
+from profiling import Stats
+from scheduler import RequestScheduler, TokenBucket
+
+# The modules for talking to Goodreads and storing the reviews take longer
+# to import than everything else put together, so they only get imported
+# once they're needed and e.g. --help doesn't have to wait for them.
+
+
+def year_range(value):
+    first, _, last = value.partition('-')
+    try:
+        first = int(first)
+        last = int(last) if last else first
+        if last < first:
+            raise ValueError(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "%s is not a range of years, e.g. 2014-2024" % value)
+    return list(range(first, last + 1))
+
+
+def positive_rate(value):
+    # TokenBucket divides by the rate, and can't wait a negative time
+    try:
+        rate = float(value)
+        if not rate > 0:
+            raise ValueError(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "%s is not a number of requests per second above 0" % value)
+    return rate
+
+
+def positive_int(value):
+    # How many threads or processes to start, at least one
+    try:
+        number = int(value)
+        if number < 1:
+            raise ValueError(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not a number above 0" % value)
+    return number
+
+
+def timer(stats, name):
+    # Only --profile keeps track of the time, otherwise this does nothing
+    return stats.timer(name) if stats is not None else suppress()
+
+
+def create_session(cache=None, pool_size=10, scheduler=None, filename=None):
+    from goodreads_session import GoodreadsSession
+    try:
+        from secrets import api_key, api_secret
+    except Exception:
+        exit("No API key/secret found.")
+    return GoodreadsSession(api_key, api_secret, cache, pool_size=pool_size,
+                            scheduler=scheduler, filename=filename)
+
+
+def create_async_session(scheduler=None, filename=None):
+    from async_session import AsyncGoodreadsSession
+    try:
+        from secrets import api_key, api_secret
+    except Exception:
+        exit("No API key/secret found.")
+
+    def authorise():
+        # The first time round, the app gets authorised the usual way
+        create_session(filename=filename).set_session()
+
+    return AsyncGoodreadsSession(api_key, api_secret, scheduler=scheduler,
+                                 filename=filename, authorise=authorise)
+
+
+def run_async(coroutine, sessions):
+    # Runs the coroutine in a new event loop, and closes the sessions'
+    # connections before the loop goes away
+    import asyncio
+
+    async def close():
+        for session in sessions:
+            await session.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(close())
+        loop.close()
+
+
+def snapshot_counts(snapshot, shelf, key, books):
+    # The counts from the last run for the same reviews, or else counted
+    # from `books()` and kept for the next one
+    counts = snapshot.load(shelf, key)
+    if counts is not None:
+        return ShelfSetCounter.from_entries(counts)
+    counter = ShelfSetCounter().add_all(books())
+    snapshot.save(shelf, key, counter.to_entries())
+    return counter
+
+
+def stored_counts(goodreads, shelf, store, snapshot):
+    # Only once the stored reviews are known to be up to date, otherwise
+    # returns None and the reviews need downloading as usual, without
+    # syncing them again (see Goodreads.iter_books)
+    from goodreads import Book
+    if not goodreads.sync_books(shelf, store):
+        return None
+    return snapshot_counts(
+        snapshot, shelf, store.fingerprint(shelf),
+        lambda: (Book.from_record(record) for record in store.load(shelf)))
+
+
+def print_counts(counter, languages=None, other=False, other_label='default',
+                 year=None, years=None, all_years=False, stats=None):
+    # The reports without --details, from a ShelfSetCounter
+    with timer(stats, 'printing'):
+        if years is not None or all_years:
+            LanguageCounter.print_table_nicely(
+                counter.count_by_year_and_language(languages, other,
+                                                   other_label, years))
+        else:
+            LanguageCounter.print_totals_nicely(
+                counter.count_by_language(languages, other, other_label,
+                                          year))
 
 
 def retrieve_and_sort_books(languages=None, other=False, other_label='default',
-                            year=None, details=False, shelf='read'):
-    session = GoodreadsSession(api_key, api_secret)
-    goodreads = Goodreads(session)
+                            year=None, details=False, shelves=None, jobs=1,
+                            use_store=True, streaming=False, years=None,
+                            all_years=False, use_cache=True, refresh=False,
+                            rate=1.0, resume=False, per_page=200,
+                            autotune=False, stats=None, columnar=False,
+                            pool=None, use_snapshot=True):
+    from goodreads import Goodreads
+    from review_store import ReviewStore
+    from snapshot import StatsSnapshot
+
+    shelves = shelves or ['read']
+    cache = ResponseCache(refresh=refresh) if use_cache else None
+    scheduler = RequestScheduler(TokenBucket(rate))
+    session = create_session(cache, max(jobs, 1) * len(shelves), scheduler)
+    goodreads = Goodreads(session, streaming, per_page, stats=stats,
+                          pool=pool)
     goodreads.initialise_user()
+    if autotune:
+        goodreads.autotune_per_page(shelves[0])
 
-    books = goodreads.get_books(shelf)
-    arranger = BookArranger(books)
+    store = ReviewStore() if use_store else None
+    # Books are sorted by date read, so there's no need to download the ones
+    # read before the first year we're interested in
+    since = year if years is None else min(years, default=None)
+    counter = None
+    synced = False
+    try:
+        if len(shelves) == 1 and store is not None and use_snapshot and \
+                not details:
+            # Reports of the totals don't need the books themselves
+            with timer(stats, 'snapshot'):
+                counter = stored_counts(goodreads, shelves[0], store,
+                                        StatsSnapshot())
+            synced = True
+        if counter is not None:
+            print_counts(counter, languages, other, other_label, year, years,
+                         all_years, stats)
+        elif len(shelves) == 1:
+            journal = FetchJournal(resume=resume)
+            books = goodreads.iter_books(shelves[0], jobs, store, journal,
+                                         since, sync=not synced)
+            sort_and_print_books(books, languages, other, other_label, year,
+                                 details, years, all_years, stats, columnar)
+        else:
+            journals = {shelf: FetchJournal('%s.%s' % (FetchJournal.filename,
+                                                       shelf), resume)
+                        for shelf in shelves}
+            books_by_shelf = goodreads.get_books_by_shelf(
+                shelves, jobs, store, journals, since)
+            sort_and_print_shelves(books_by_shelf, languages, other,
+                                   other_label, year, details, stats,
+                                   columnar)
+    finally:
+        if store is not None:
+            store.close()
 
-    sorted_books = arranger.sort_by_language(languages, other, other_label,
-                                             year)
-    arranger.print_sorted_books_nicely(sorted_books, details)
+    logger = logging.getLogger('rattle_cli')
+    logger.info(
+        "HTTP connections: %(new_connections)s new, %(reused_connections)s "
+        "reused for %(requests)s requests", session.connection_stats())
+    logger.info(
+        "Requests: %(requests)s, retried %(retries)s times, waited "
+        "%(throttled).1fs for the rate limit and %(backed_off).1fs after "
+        "errors", scheduler.stats())
 
 
-def main():
+def retrieve_and_sort_books_async(languages=None, other=False,
+                                  other_label='default', year=None,
+                                  details=False, shelves=None, years=None,
+                                  all_years=False, rate=1.0, per_page=200,
+                                  stats=None, columnar=False, pool=None):
+    # Same as retrieve_and_sort_books, with every page of every shelf
+    # requested at once from a single thread. Only --rate holds them back.
+    from goodreads import Goodreads
+
+    shelves = shelves or ['read']
+    scheduler = RequestScheduler(TokenBucket(rate))
+    session = create_async_session(scheduler)
+    goodreads = Goodreads(session, per_page=per_page, stats=stats, pool=pool)
+    books_by_shelf = run_async(goodreads.get_books_by_shelf_async(shelves),
+                               [session])
+    if len(shelves) == 1:
+        sort_and_print_books(books_by_shelf[shelves[0]], languages, other,
+                             other_label, year, details, years, all_years,
+                             stats, columnar)
+    else:
+        sort_and_print_shelves(books_by_shelf, languages, other, other_label,
+                               year, details, stats, columnar)
+
+    logger = logging.getLogger('rattle_cli')
+    logger.info(
+        "HTTP connections: %(new_connections)s new, %(reused_connections)s "
+        "reused for %(requests)s requests", session.connection_stats())
+    logger.info(
+        "Requests: %(requests)s, retried %(retries)s times, waited "
+        "%(throttled).1fs for the rate limit and %(backed_off).1fs after "
+        "errors", scheduler.stats())
+
+
+def retrieve_and_count_users(manifest, languages=None, other=False,
+                             other_label='default', year=None, shelf='read',
+                             jobs=1, workers=4, use_store=True,
+                             streaming=False, use_cache=True, refresh=False,
+                             rate=1.0, per_page=200, stats=None, pool=None,
+                             use_snapshot=True, use_async=False):
+    from batch import BatchRun, read_manifest
+    from goodreads import Goodreads
+    from review_store import ReviewStore
+    from snapshot import StatsSnapshot
+
+    users = read_manifest(manifest)
+    cache = ResponseCache(refresh=refresh) if use_cache else None
+    # Everyone's requests count towards the same limit
+    scheduler = RequestScheduler(TokenBucket(rate))
+
+    def count_books(name, token_file):
+        session = create_session(cache, max(jobs, 1), scheduler, token_file)
+        goodreads = Goodreads(session, streaming, per_page, stats=stats,
+                              pool=pool)
+        goodreads.initialise_user()
+        store = (ReviewStore('%s.%s' % (ReviewStore.filename, name))
+                 if use_store else None)
+        try:
+            synced = False
+            if store is not None and use_snapshot:
+                snapshot = StatsSnapshot('%s.%s' % (StatsSnapshot.filename,
+                                                    name))
+                counter = stored_counts(goodreads, shelf, store, snapshot)
+                if counter is not None:
+                    return counter.count_by_language(languages, other,
+                                                     other_label, year)
+                synced = True
+            counter = LanguageCounter(languages, other, other_label, year)
+            return counter.add_all(goodreads.iter_books(
+                shelf, jobs, store, year=year, sync=not synced))
+        finally:
+            if store is not None:
+                store.close()
+
+    sessions = []
+
+    async def count_books_async(name, token_file):
+        session = create_async_session(scheduler, token_file)
+        sessions.append(session)
+        goodreads = Goodreads(session, per_page=per_page, stats=stats,
+                              pool=pool)
+        counter = LanguageCounter(languages, other, other_label, year)
+        return counter.add_all(await goodreads.get_books_async(shelf))
+
+    if use_async:
+        batch = BatchRun(count_books_async)
+        results = run_async(batch.run_async(users), sessions)
+    else:
+        batch = BatchRun(count_books, workers)
+        results = batch.run(users)
+    with timer(stats, 'printing'):
+        LanguageCounter.print_table_nicely(BatchRun.with_total(results))
+    for name, reason in batch.failures.items():
+        print("Couldn't get the reviews for %s: %s" % (name, reason))
+
+    logger = logging.getLogger('rattle_cli')
+    logger.info(
+        "Requests: %(requests)s, retried %(retries)s times, waited "
+        "%(throttled).1fs for the rate limit and %(backed_off).1fs after "
+        "errors", scheduler.stats())
+
+
+def read_and_sort_books(source, languages=None, other=False,
+                        other_label='default', year=None, details=False,
+                        shelves=None, years=None, all_years=False,
+                        stats=None, columnar=False, pool=None,
+                        use_snapshot=True):
+    # Same as retrieve_and_sort_books, from local files rather than the API
+    from goodreads import Goodreads
+    from snapshot import StatsSnapshot
+
+    shelves = shelves or ['read']
+    goodreads = Goodreads(None, source=source, stats=stats, pool=pool)
+    if len(shelves) == 1 and use_snapshot and not details:
+        with timer(stats, 'snapshot'):
+            counter = snapshot_counts(
+                StatsSnapshot(), shelves[0], source.fingerprint(),
+                lambda: goodreads.iter_books(shelves[0]))
+        print_counts(counter, languages, other, other_label, year, years,
+                     all_years, stats)
+    elif len(shelves) == 1:
+        sort_and_print_books(goodreads.iter_books(shelves[0]), languages,
+                             other, other_label, year, details, years,
+                             all_years, stats, columnar)
+    else:
+        sort_and_print_shelves(goodreads.get_books_by_shelf(shelves),
+                               languages, other, other_label, year, details,
+                               stats, columnar)
+
+
+def sort_and_print_books(books, languages=None, other=False,
+                         other_label='default', year=None, details=False,
+                         years=None, all_years=False, stats=None,
+                         columnar=False):
+    # Books may still be downloading while they get indexed or counted, so
+    # only the sorting and printing themselves get their own timers
+    if (years is not None or all_years) and columnar and not details:
+        # Only the counts are needed, which the columns work out without
+        # putting the books back together
+        arranger = ColumnarBookArranger(books)
+        with timer(stats, 'sorting'):
+            counts = arranger.count_by_year_and_language(
+                languages, other, other_label, years)
+        with timer(stats, 'printing'):
+            LanguageCounter.print_table_nicely(counts)
+    elif years is not None or all_years:
+        arranger = (ColumnarBookArranger if columnar else BookArranger)(books)
+        with timer(stats, 'sorting'):
+            sorted_books = arranger.sort_by_year_and_language(
+                languages, other, other_label, years)
+        with timer(stats, 'printing'):
+            BookArranger.print_table_nicely(sorted_books)
+            if details:
+                for year, year_books in sorted_books.items():
+                    print("")
+                    print("%s:" % year)
+                    BookArranger.print_books(year_books, details)
+    elif details:
+        arranger = (ColumnarBookArranger if columnar else BookArranger)(books)
+        with timer(stats, 'sorting'):
+            sorted_books = arranger.sort_by_language(languages, other,
+                                                     other_label, year)
+        with timer(stats, 'printing'):
+            arranger.print_sorted_books_nicely(sorted_books, details)
+    else:
+        # Only the totals are needed, no need to keep the books around
+        counter = LanguageCounter(languages, other, other_label, year)
+        counter.add_all(books)
+        with timer(stats, 'printing'):
+            counter.print_counts_nicely()
+
+
+def sort_and_print_shelves(books_by_shelf, languages=None, other=False,
+                           other_label='default', year=None, details=False,
+                           stats=None, columnar=False):
+    if columnar and not details:
+        with timer(stats, 'sorting'):
+            counts = OrderedDict(
+                (shelf, ColumnarBookArranger(books).count_by_language(
+                    languages, other, other_label, year))
+                for shelf, books in books_by_shelf.items())
+        with timer(stats, 'printing'):
+            LanguageCounter.print_table_nicely(counts)
+        return
+
+    arranger_class = ColumnarBookArranger if columnar else BookArranger
+    with timer(stats, 'sorting'):
+        sorted_books = OrderedDict(
+            (shelf, arranger_class(books).sort_by_language(
+                languages, other, other_label, year))
+            for shelf, books in books_by_shelf.items())
+
+    with timer(stats, 'printing'):
+        BookArranger.print_table_nicely(sorted_books)
+        if details:
+            for shelf, books in sorted_books.items():
+                print("")
+                print("%s:" % shelf)
+                BookArranger.print_books(books, details)
+
+
+def configure_logging(level=logging.WARNING, background=False):
     log_format = '%(asctime)s - %(levelname)s:%(name)s:%(message)s'
-    logging.basicConfig(filename='rattle.log',
-                        filemode='w',
-                        level=logging.WARNING,
-                        format=log_format)
+    if not background:
+        logging.basicConfig(filename='rattle.log',
+                            filemode='w',
+                            level=level,
+                            format=log_format)
+        return None
 
+    # The threads parsing the reviews only put the records in a queue, and
+    # writing them to the file happens in a thread of its own
+    from logging.handlers import QueueHandler, QueueListener
+    from queue import Queue
+
+    handler = logging.FileHandler('rattle.log', mode='w')
+    handler.setFormatter(logging.Formatter(log_format))
+    queue = Queue()
+    queue_handler = QueueHandler(queue)
+    # Only the message gets formatted on the way in, the rest on the way out
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=level, handlers=[queue_handler])
+    listener = QueueListener(queue, handler)
+    listener.start()
+    return listener
+
+
+def main():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
         description="""
@@ -70,24 +469,244 @@ them in the final count regardless:
                         help="If --other is set, what to call this new list \
                         (e.g. if your default language is English and you \
                         never set a shelf for it, you could call it 'en'")
-    parser.add_argument("--year", type=int,
-                        help="Which year to calculate the stats for. Defaults \
-                        to all books ever read on Goodreads")
+    year_group = parser.add_mutually_exclusive_group()
+    year_group.add_argument("--year", type=int,
+                            help="Which year to calculate the stats for. \
+                            Defaults to all books ever read on Goodreads")
+    year_group.add_argument("--years", type=year_range,
+                            help="Show the stats for each year in a range, \
+                            e.g. 2014-2024, as a table")
+    year_group.add_argument("--all-years",
+                            help="Show the stats for every year books were \
+                            read in, as a table",
+                            action="store_true")
     parser.add_argument("--details",
                         help="Also show the book details for each language",
                         action="store_true")
-    parser.add_argument("--status-shelf",
-                        help="One of your exclusive shelves, by default one of; \
-                        read, currently-reading, to-read. Default value: read",
-                        nargs="?", default="read")
+    parser.add_argument("--status-shelf", "--status-shelves",
+                        help="Space-separated exclusive shelf name(s), by \
+                        default some of; read, currently-reading, to-read. \
+                        Default value: read",
+                        nargs="+", default=["read"])
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="How many review pages to download at the same \
+                        time. Default value: 1")
+    parser.add_argument("--processes", type=positive_int, metavar="N",
+                        help="Parse the review pages in N other processes, \
+                        to make use of more than one core with --jobs, \
+                        --batch, --async or --from-xml")
+    parser.add_argument("--no-store",
+                        help="Don't keep the reviews in a local database, \
+                        download all of them again instead",
+                        action="store_true")
+    parser.add_argument("--stream",
+                        help="Parse the reviews while they are being \
+                        downloaded, rather than once each page is complete",
+                        action="store_true")
+    parser.add_argument("--no-snapshot",
+                        help="Count the books again, rather than use the \
+                        totals saved by an earlier run for the same reviews",
+                        action="store_true")
+    parser.add_argument("--no-cache",
+                        help="Don't keep the Goodreads responses around for \
+                        the next few minutes",
+                        action="store_true")
+    parser.add_argument("--refresh",
+                        help="Ignore the responses saved by earlier runs",
+                        action="store_true")
+    parser.add_argument("--rate", type=positive_rate, default=1.0,
+                        help="How many requests per second to send to \
+                        Goodreads at most. Default value: 1")
+    parser.add_argument("--resume",
+                        help="Carry on from where an interrupted download \
+                        stopped, rather than starting again from page 1",
+                        action="store_true")
+    parser.add_argument("--per-page", type=int, default=200,
+                        help="How many reviews to get with each request. \
+                        Default value: 200, the most Goodreads allows")
+    parser.add_argument("--autotune",
+                        help="Try a few different --per-page values and use \
+                        the one that looks the quickest",
+                        action="store_true")
+    parser.add_argument("--async", dest="use_async",
+                        help="Request all the pages at once from a single \
+                        thread, still no faster than --rate. Everything \
+                        gets downloaded every time, without the local \
+                        database or cache",
+                        action="store_true")
+    parser.add_argument("--batch", metavar="MANIFEST",
+                        help="JSON file of user names and their access token \
+                        files, to show everyone's stats side by side")
+    parser.add_argument("--workers", type=positive_int, default=4,
+                        help="With --batch, how many users to download at \
+                        the same time. Default value: 4")
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument("--from-xml", metavar="FILE", nargs="+",
+                              help="Read the reviews from review list pages \
+                              saved from the Goodreads API, instead of \
+                              downloading them")
+    source_group.add_argument("--from-csv", metavar="FILE",
+                              help="Read the reviews from a Goodreads library \
+                              export, instead of downloading them")
+    parser.add_argument("--profile",
+                        help="Show how long each stage took, and how many \
+                        requests, bytes and reviews it went through",
+                        action="store_true")
+    parser.add_argument("--profile-json", metavar="FILE",
+                        help="Save the same timings and counts as JSON")
+    parser.add_argument("--cprofile", metavar="FILE",
+                        help="Save a cProfile profile of the whole run, e.g. \
+                        to look at with pstats or snakeviz")
+    parser.add_argument("--log-level", default="WARNING",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="How much to write to rattle.log. Default \
+                        value: WARNING")
+    parser.add_argument("--background-log",
+                        help="Write to rattle.log from a separate thread, so \
+                        that parsing doesn't wait for the file",
+                        action="store_true")
+    parser.add_argument("--columnar",
+                        help="Keep the books as columns of numbers rather \
+                        than one object each, quicker for the tables of \
+                        large libraries",
+                        action="store_true")
     args = parser.parse_args()
+    # Each shelf only once, in the order given
+    args.status_shelf = list(OrderedDict.fromkeys(args.status_shelf))
+
+    if args.batch and (args.years or args.all_years or args.details or
+                       args.resume or len(args.status_shelf) > 1):
+        parser.error("--batch only works with a single --year and "
+                     "--status-shelf, without --details or --resume")
+    if args.from_xml and len(args.status_shelf) > 1:
+        # Nothing in the pages says which shelf they were downloaded for
+        parser.error("--from-xml only works with a single --status-shelf")
+    if (args.years or args.all_years) and len(args.status_shelf) > 1:
+        parser.error("--years and --all-years only work with a single "
+                     "--status-shelf")
+    if args.use_async:
+        from importlib.util import find_spec
+        if find_spec('aiohttp') is None:
+            parser.error("--async needs aiohttp, see README.rst")
+
+    listener = configure_logging(getattr(logging, args.log_level),
+                                 args.background_log)
+    stats = Stats() if args.profile or args.profile_json else None
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with timer(stats, 'total'):
+            run(args, stats)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        if listener is not None:
+            # Waits for whatever is still in the queue to be written
+            listener.stop()
+
+    if args.profile:
+        stats.print_summary()
+    if args.profile_json:
+        stats.write_json(args.profile_json)
+
+
+def run(args, stats=None):
+    # Everything shares the same processes, e.g. all the users of a batch
+    pool = None
+    if args.processes:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=args.processes)
+    try:
+        run_with_pool(args, stats, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def run_with_pool(args, stats=None, pool=None):
+    if args.from_xml or args.from_csv:
+        from data_sources import CSVExportSource, XMLPagesSource
+        if args.from_xml:
+            source = XMLPagesSource(args.from_xml, args.processes or 1)
+        else:
+            source = CSVExportSource(args.from_csv)
+        read_and_sort_books(source,
+                            languages=args.lang,
+                            other=args.other,
+                            other_label=args.other_label,
+                            year=args.year,
+                            details=args.details,
+                            shelves=args.status_shelf,
+                            years=args.years,
+                            all_years=args.all_years,
+                            stats=stats,
+                            columnar=args.columnar,
+                            pool=pool,
+                            use_snapshot=not args.no_snapshot)
+        return
+
+    if args.batch:
+        retrieve_and_count_users(args.batch,
+                                 languages=args.lang,
+                                 other=args.other,
+                                 other_label=args.other_label,
+                                 year=args.year,
+                                 shelf=args.status_shelf[0],
+                                 jobs=args.jobs,
+                                 workers=args.workers,
+                                 use_store=not args.no_store,
+                                 streaming=args.stream,
+                                 use_cache=not args.no_cache,
+                                 refresh=args.refresh,
+                                 rate=args.rate,
+                                 per_page=args.per_page,
+                                 stats=stats,
+                                 pool=pool,
+                                 use_snapshot=not args.no_snapshot,
+                                 use_async=args.use_async)
+        return
+
+    if args.use_async:
+        retrieve_and_sort_books_async(languages=args.lang,
+                                      other=args.other,
+                                      other_label=args.other_label,
+                                      year=args.year,
+                                      details=args.details,
+                                      shelves=args.status_shelf,
+                                      years=args.years,
+                                      all_years=args.all_years,
+                                      rate=args.rate,
+                                      per_page=args.per_page,
+                                      stats=stats,
+                                      columnar=args.columnar,
+                                      pool=pool)
+        return
 
     retrieve_and_sort_books(languages=args.lang,
                             other=args.other,
                             other_label=args.other_label,
                             year=args.year,
                             details=args.details,
-                            shelf=args.status_shelf)
+                            shelves=args.status_shelf,
+                            jobs=args.jobs,
+                            use_store=not args.no_store,
+                            streaming=args.stream,
+                            years=args.years,
+                            all_years=args.all_years,
+                            use_cache=not args.no_cache,
+                            refresh=args.refresh,
+                            rate=args.rate,
+                            resume=args.resume,
+                            per_page=args.per_page,
+                            autotune=args.autotune,
+                            stats=stats,
+                            columnar=args.columnar,
+                            pool=pool,
+                            use_snapshot=not args.no_snapshot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+
+
+class ReviewStore():
+
+    filename = '.reviews.sqlite'
+
+    # Records are (review id, title, author, date read, date updated,
+    # shelves), with the dates kept in the format Goodreads sends them in.
+    # Positions follow the order of the API, i.e. most recently read first.
+    schema = """
+        CREATE TABLE IF NOT EXISTS reviews (
+            id TEXT PRIMARY KEY,
+            shelf TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            title TEXT,
+            author TEXT,
+            date_read TEXT,
+            date_updated TEXT,
+            shelves TEXT
+        );
+        CREATE INDEX IF NOT EXISTS reviews_by_shelf
+            ON reviews (shelf, position);
+    """
+
+    def __init__(self, filename=None):
+        self.logger = logging.getLogger('review_store')
+        if filename is not None:
+            self.filename = filename
+        # Several shelves may be downloaded at the same time, each in its
+        # own thread, so every use of the connection goes through the lock
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.filename,
+                                          check_same_thread=False)
+        self.connection.executescript(self.schema)
+
+    batch_size = 500
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def count(self, shelf):
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT COUNT(*) FROM reviews WHERE shelf = ?", (shelf,))
+            return cursor.fetchone()[0]
+
+    def is_current(self, review_id, date_updated):
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT date_updated FROM reviews WHERE id = ?", (review_id,))
+            row = cursor.fetchone()
+        return row is not None and row[0] == date_updated
+
+    def fingerprint(self, shelf):
+        # A hash of everything stored for the shelf, which changes as soon
+        # as any of its reviews gets added, removed or updated
+        digest = hashlib.sha1()
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, title, author, date_read, date_updated, shelves "
+                "FROM reviews WHERE shelf = ? ORDER BY position", (shelf,))
+            for row in rows:
+                digest.update(json.dumps(row).encode('utf-8'))
+        return digest.hexdigest()
+
+    def load(self, shelf):
+        # One batch at a time, without keeping a cursor open in between so
+        # that other threads can use the connection meanwhile
+        position = None
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT position, id, title, author, date_read, "
+                    "date_updated, shelves FROM reviews WHERE shelf = ? "
+                    "AND (? IS NULL OR position > ?) ORDER BY position "
+                    "LIMIT ?",
+                    (shelf, position, position, self.batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1:6] + (json.loads(row[6]),)
+            position = rows[-1][0]
+
+    def replace(self, shelf, records):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM reviews WHERE shelf = ?",
+                                    (shelf,))
+            self._insert(shelf, records, 0)
+        self.logger.info("Stored %s reviews for shelf %s",
+                         len(records), shelf)
+
+    def clear(self, shelf):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM reviews WHERE shelf = ?",
+                                    (shelf,))
+
+    def append(self, shelf, records):
+        # For downloads in progress, one page at a time
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "SELECT MAX(position) FROM reviews WHERE shelf = ?", (shelf,))
+            last = cursor.fetchone()[0]
+            self._insert(shelf, records, 0 if last is None else last + 1)
+
+    def prepend(self, shelf, records):
+        # Freshly synced reviews are the most recently read ones, so they go
+        # before everything already stored for that shelf.
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "SELECT MIN(position) FROM reviews WHERE shelf = ?", (shelf,))
+            first = cursor.fetchone()[0] or 0
+            self._insert(shelf, records, first - len(records))
+        self.logger.info("Updated %s reviews for shelf %s",
+                         len(records), shelf)
+
+    def _insert(self, shelf, records, first_position):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((review_id, shelf, first_position + position, title, author,
+              date_read, date_updated, json.dumps(list(shelves)))
+             for position, (review_id, title, author, date_read, date_updated,
+                            shelves) in enumerate(records)))
@@ -0,0 +1,176 @@
+import logging
+import random
+import threading
+import time
+
+
+class TokenBucket():
+
+    # Hands out one token per request, at most `rate` tokens per second on
+    # average with bursts of up to `capacity`. The rate is halved whenever
+    # the server complains and creeps back up while it doesn't.
+
+    def __init__(self, rate=1.0, capacity=1, min_rate=0.05,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Returns how long we had to wait for a token
+        waited = 0.0
+        while True:
+            delay = self.take()
+            if not delay:
+                return waited
+            self.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self):
+        # Same as acquire, waiting without blocking the event loop. asyncio
+        # is slow to import, and only needed by the async session.
+        import asyncio
+        waited = 0.0
+        while True:
+            delay = self.take()
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def take(self):
+        # Takes a token if there is one, otherwise returns how long until
+        # the next one
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class RequestScheduler():
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, bucket=None, max_retries=5, backoff=1.0,
+                 max_backoff=60.0, sleep=time.sleep):
+        self.logger = logging.getLogger('scheduler')
+        self.bucket = bucket if bucket is not None else TokenBucket()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0.0
+        self.backed_off = 0.0
+
+    def send(self, send, url, *args, **kwargs):
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            try:
+                response = send(url, *args, **kwargs)
+            except OSError as e:
+                # requests' connection errors and timeouts are OSErrors
+                if attempt >= self.max_retries:
+                    raise
+                reason = e
+                delay = self.backoff_delay(attempt)
+            else:
+                delay = self.response_delay(response, attempt)
+                if delay is None:
+                    self.count(waited)
+                    return response
+                reason = response.status_code
+
+            attempt += 1
+            self.logger.warning("Retrying %s in %.1fs (attempt %s): %s",
+                                url, delay, attempt, reason)
+            self.count(waited, delay)
+            self.sleep(delay)
+
+    async def send_async(self, send, url, *args, **kwargs):
+        # Same as send, for coroutines, e.g. AsyncGoodreadsSession.send
+        import asyncio
+        attempt = 0
+        while True:
+            waited = await self.bucket.acquire_async()
+            try:
+                response = await send(url, *args, **kwargs)
+            except (OSError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason = e
+                delay = self.backoff_delay(attempt)
+            else:
+                delay = self.response_delay(response, attempt)
+                if delay is None:
+                    self.count(waited)
+                    return response
+                reason = response.status_code
+
+            attempt += 1
+            self.logger.warning("Retrying %s in %.1fs (attempt %s): %s",
+                                url, delay, attempt, reason)
+            self.count(waited, delay)
+            await asyncio.sleep(delay)
+
+    def response_delay(self, response, attempt):
+        # How long to wait before trying again, or None to keep the response
+        if (response.status_code not in self.retry_statuses or
+                attempt >= self.max_retries):
+            self.bucket.speed_up()
+            return None
+        delay = max(self.retry_after(response), self.backoff_delay(attempt))
+        if response.status_code == 429:
+            self.bucket.slow_down()
+        return delay
+
+    def backoff_delay(self, attempt):
+        # "Full jitter", so that parallel requests don't all come back at
+        # the same time
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def retry_after(self, response):
+        try:
+            return min(self.max_backoff,
+                       float(response.headers.get('Retry-After', 0)))
+        except (TypeError, ValueError):
+            # It can also be a date, let's not bother with that
+            return 0.0
+
+    def count(self, waited, delay=None):
+        with self.lock:
+            self.requests += 1
+            self.throttled += waited
+            if delay is not None:
+                self.retries += 1
+                self.backed_off += delay
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests,
+                    'retries': self.retries,
+                    'throttled': self.throttled,
+                    'backed_off': self.backed_off}
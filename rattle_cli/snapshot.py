@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+import threading
+
+
+class StatsSnapshot():
+
+    filename = '.rattle_snapshot'
+
+    # Bumped whenever what gets counted changes, so that older snapshots
+    # are ignored rather than misread
+    version = 1
+
+    # The book counts per shelf from the last run (see
+    # bookarranger.ShelfSetCounter), each with a hash of the reviews they
+    # were counted from. As long as the hash of the reviews is the same,
+    # reports that only need the totals can use the counts as they are.
+
+    def __init__(self, filename=None):
+        self.logger = logging.getLogger('snapshot')
+        if filename is not None:
+            self.filename = filename
+        self.lock = threading.Lock()
+
+    def load(self, shelf, key):
+        with self.lock:
+            entry = self.read().get(shelf)
+        if entry is None or entry.get('key') != key:
+            self.logger.info("No snapshot of %s for the current reviews",
+                             shelf)
+            return None
+        self.logger.info("Using the snapshot of %s", shelf)
+        return entry['counts']
+
+    def save(self, shelf, key, counts):
+        with self.lock:
+            shelves = self.read()
+            shelves[shelf] = {'key': key, 'counts': counts}
+            temporary = '%s.%s.tmp' % (self.filename, os.getpid())
+            try:
+                with open(temporary, 'w') as f:
+                    json.dump({'version': self.version, 'shelves': shelves},
+                              f)
+                os.replace(temporary, self.filename)
+            except OSError:
+                self.logger.exception("Couldn't save the snapshot of %s",
+                                      shelf)
+
+    def read(self):
+        try:
+            with open(self.filename, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            # Nothing saved yet, or half a file
+            return {}
+        if not isinstance(snapshot, dict) or \
+                snapshot.get('version') != self.version:
+            return {}
+        return snapshot.get('shelves', {})
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import deque
+import gzip
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import threading
+from urllib.parse import parse_qsl, urlsplit
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+
+    # Keeps the connection open between requests, like Goodreads does
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.respond(self)
+
+    def do_POST(self):
+        self.server.respond(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubGoodreadsServer(ThreadingMixIn, HTTPServer):
+
+    # A local stand-in for the parts of the Goodreads API we use. Pages are
+    # the review/list responses, in order. Responses queued in `responses`
+    # are sent first, whatever the request.
+
+    daemon_threads = True
+
+    user_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<GoodreadsResponse>
+  <Request />
+  <user id="%s">
+    <name>Test User</name>
+  </user>
+</GoodreadsResponse>
+"""
+
+    def __init__(self, pages=(), user_id="1234", gzip=False, chunked=False):
+        super().__init__(('127.0.0.1', 0), StubRequestHandler)
+        self.pages = list(pages)
+        self.user_id = user_id
+        self.gzip = gzip
+        self.chunked = chunked
+        self.responses = deque()
+        # (method, path, headers, parameters) for each request
+        self.requests = []
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server_address[:2]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+    def respond(self, handler):
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length).decode('ascii')
+        parts = urlsplit(handler.path)
+        parameters = dict(parse_qsl(parts.query))
+        parameters.update(parse_qsl(body))
+        with self.lock:
+            self.requests.append((handler.command, parts.path,
+                                  handler.headers, parameters))
+            queued = self.responses.popleft() if self.responses else None
+
+        headers = {}
+        if queued is not None:
+            status, headers, content = queued
+        elif parts.path == '/api/auth_user':
+            status, content = 200, self.user_xml % self.user_id
+        elif parts.path == '/review/list/%s.xml' % self.user_id:
+            status, content = 200, self.pages[int(parameters['page']) - 1]
+        else:
+            status, content = 404, "Not found"
+        self.send(handler, status, dict(headers), content.encode('utf-8'))
+
+    def send(self, handler, status, headers, content):
+        handler.send_response(status)
+        if self.gzip:
+            content = gzip.compress(content)
+            headers['Content-Encoding'] = 'gzip'
+        if self.chunked:
+            headers['Transfer-Encoding'] = 'chunked'
+        else:
+            headers['Content-Length'] = str(len(content))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+
+        if not self.chunked:
+            handler.wfile.write(content)
+            return
+        for start in range(0, len(content), 1000):
+            chunk = content[start:start + 1000]
+            handler.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        handler.wfile.write(b'0\r\n\r\n')
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from rauth.oauth import HmacSha1Signature
+from rauth.utils import FORM_URLENCODED
+
+from rattle_cli.async_session import AsyncGoodreadsSession, oauth_header
+from rattle_cli.scheduler import RequestScheduler, TokenBucket
+from rattle_cli.tests.stub_server import StubGoodreadsServer
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def parse_oauth(header):
+    return dict(re.findall(r'(\w+)="([^"]*)"', header))
+
+
+class TestOAuthHeader(unittest.TestCase):
+
+    def sign(self, method, url, params):
+        header = oauth_header(method, url, params, "key", "secret",
+                              "token", "token secret", nonce="abc",
+                              timestamp=1500000000)
+        return parse_oauth(header)
+
+    def test_same_as_rauth(self):
+        url = "https://www.goodreads.com/review/list/1234.xml?v=2"
+        params = {'page': 3, 'shelf': 'to-read', 'sort': 'date_read'}
+        oauth = self.sign('post', url, params)
+        expected = HmacSha1Signature().sign(
+            "secret", "token secret", 'POST', url,
+            {name: value for name, value in oauth.items()
+             if name != 'oauth_signature'},
+            {'params': {'v': '2'}, 'data': params,
+             'headers': {'Content-Type': FORM_URLENCODED}})
+        self.assertEqual(oauth['oauth_signature'],
+                         re.sub('([/+=])', lambda m: '%%%02X' % ord(
+                             m.group(1)), expected))
+
+    def test_fields(self):
+        oauth = self.sign('get', "https://www.goodreads.com/api/auth_user",
+                          {})
+        self.assertEqual(oauth['oauth_consumer_key'], "key")
+        self.assertEqual(oauth['oauth_token'], "token")
+        self.assertEqual(oauth['oauth_nonce'], "abc")
+        self.assertEqual(oauth['oauth_timestamp'], "1500000000")
+        self.assertEqual(oauth['oauth_signature_method'], "HMAC-SHA1")
+
+    def test_parameters_are_signed(self):
+        url = "https://www.goodreads.com/review/list/1234.xml"
+        self.assertNotEqual(self.sign('post', url, {'page': 1}),
+                            self.sign('post', url, {'page': 2}))
+        self.assertNotEqual(self.sign('post', url, {'page': 1}),
+                            self.sign('get', url, {'page': 1}))
+        self.assertEqual(self.sign('get', url.replace('.com', '.com:443'),
+                                   {}),
+                         self.sign('get', url, {}))
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp isn't installed")
+class TestAsyncGoodreadsSession(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'token')
+        with open(self.filename, 'w') as f:
+            f.write("token\ntoken secret\n")
+        self.server = StubGoodreadsServer(pages=["<page/>"]).start()
+        self.session = AsyncGoodreadsSession("key", "secret",
+                                             filename=self.filename)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def request(self, *requests):
+        async def send():
+            try:
+                return [await getattr(self.session, method)(
+                    self.server.url + path, params)
+                    for method, path, params in requests]
+            finally:
+                await self.session.close()
+        return run(send())
+
+    def test_token_file(self):
+        self.session.set_session()
+        self.assertEqual(self.session.access_token, "token")
+        self.assertEqual(self.session.access_token_secret, "token secret")
+
+    def test_no_token_file(self):
+        os.remove(self.filename)
+        with self.assertRaises(RuntimeError):
+            self.session.set_session()
+
+        def authorise():
+            with open(self.filename, 'w') as f:
+                f.write("new token\nnew secret\n")
+        self.session.authorise = authorise
+        self.session.set_session()
+        self.assertEqual(self.session.access_token, "new token")
+
+    def test_signed_requests(self):
+        user, page = self.request(
+            ('get', '/api/auth_user', None),
+            ('post', '/review/list/1234.xml', {'page': 1, 'v': 2}))
+        self.assertEqual(user.status_code, 200)
+        self.assertIn(b'<user id="1234">', user.content)
+        self.assertEqual(page.content, b"<page/>")
+
+        for method, path, headers, parameters in self.server.requests:
+            oauth = parse_oauth(headers['Authorization'])
+            expected = parse_oauth(oauth_header(
+                method, self.server.url + path, parameters, "key", "secret",
+                "token", "token secret", oauth['oauth_nonce'],
+                int(oauth['oauth_timestamp'])))
+            self.assertEqual(oauth['oauth_signature'],
+                             expected['oauth_signature'])
+        self.assertEqual(self.server.requests[1][3], {'page': '1', 'v': '2'})
+
+    def test_keep_alive(self):
+        self.request(*[('get', '/api/auth_user', None)] * 3)
+        self.assertEqual(self.session.connection_stats(),
+                         {'requests': 3, 'new_connections': 1,
+                          'reused_connections': 2})
+
+    def test_gzip_and_chunked(self):
+        self.server.gzip = True
+        self.server.chunked = True
+        self.server.pages = ["<page>%s</page>" % ("x" * 5000)]
+        page, = self.request(('post', '/review/list/1234.xml', {'page': 1}))
+        self.assertEqual(page.content,
+                         ("<page>%s</page>" % ("x" * 5000)).encode('ascii'))
+
+    def test_not_found(self):
+        response, = self.request(('get', '/nothing', None))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b"Not found")
+
+    def test_rate_limit_and_retries(self):
+        self.session.scheduler = RequestScheduler(TokenBucket(100),
+                                                  backoff=0)
+        self.server.responses.append((503, {'Retry-After': '0'}, ""))
+        response, = self.request(('get', '/api/auth_user', None))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.session.scheduler.stats()['retries'], 1)
+
+    def test_many_requests_at_once(self):
+        self.session.pool_size = 4
+
+        async def send_all():
+            try:
+                return await asyncio.gather(*(
+                    self.session.get(self.server.url + '/api/auth_user')
+                    for _ in range(20)))
+            finally:
+                await self.session.close()
+        responses = run(send_all())
+        self.assertEqual(len(responses), 20)
+        self.assertEqual(self.session.requests, 20)
+        self.assertLessEqual(self.session.connections, 4)
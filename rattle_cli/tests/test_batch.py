@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from rattle_cli.batch import BatchRun, read_manifest
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'club.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_manifest(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"bob": "tokens/bob", "alice": "/tmp/alice"}')
+        users = read_manifest(self.filename)
+        self.assertEqual(list(users), ['bob', 'alice'])
+        self.assertEqual(users['bob'],
+                         os.path.join(self.directory, 'tokens/bob'))
+        self.assertEqual(users['alice'], '/tmp/alice')
+
+
+class TestBatchRun(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.users = {}
+        for name in ['alice', 'bob', 'carol']:
+            self.users[name] = os.path.join(self.directory, name)
+            with open(self.users[name], 'w') as f:
+                f.write("token\nsecret\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def counts(self, name, token_file):
+        return {'fr': len(name), 'ja': 1}
+
+    def test_run(self):
+        results = BatchRun(self.counts).run(self.users)
+        self.assertEqual(results, {'alice': {'fr': 5, 'ja': 1},
+                                   'bob': {'fr': 3, 'ja': 1},
+                                   'carol': {'fr': 5, 'ja': 1}})
+
+    def test_users_in_parallel(self):
+        # Would time out if the users were fetched one after the other
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fetch(name, token_file):
+            barrier.wait()
+            return self.counts(name, token_file)
+
+        batch = BatchRun(fetch, workers=3)
+        self.assertEqual(len(batch.run(self.users)), 3)
+        self.assertEqual(batch.failures, {})
+
+    def test_missing_token(self):
+        os.remove(self.users['bob'])
+        fetched = []
+
+        def fetch(name, token_file):
+            fetched.append(name)
+            return self.counts(name, token_file)
+
+        batch = BatchRun(fetch)
+        results = batch.run(self.users)
+        self.assertNotIn('bob', fetched)
+        self.assertEqual(sorted(results), ['alice', 'carol'])
+        self.assertIn('no access token', batch.failures['bob'])
+
+    def test_failures_dont_stop_others(self):
+        def fetch(name, token_file):
+            if name == 'alice':
+                raise ValueError("Bad XML")
+            if name == 'bob':
+                exit("Couldn't get the user ID from the OAuth session.")
+            return self.counts(name, token_file)
+
+        batch = BatchRun(fetch)
+        results = batch.run(self.users)
+        self.assertEqual(list(results), ['carol'])
+        self.assertEqual(batch.failures['alice'], "Bad XML")
+        self.assertIn("user ID", batch.failures['bob'])
+        self.assertEqual(list(batch.seconds), ['carol'])
+
+    def test_run_async(self):
+        # Would never finish if the users were fetched one after the other
+        started = []
+
+        async def fetch(name, token_file):
+            started.append(name)
+            while len(started) < 2:
+                await asyncio.sleep(0)
+            if name == 'alice':
+                raise ValueError("Bad XML")
+            return self.counts(name, token_file)
+
+        os.remove(self.users['carol'])
+        batch = BatchRun(fetch)
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(batch.run_async(self.users))
+        finally:
+            loop.close()
+        self.assertEqual(results, {'bob': {'fr': 3, 'ja': 1}})
+        self.assertEqual(batch.failures['alice'], "Bad XML")
+        self.assertIn('no access token', batch.failures['carol'])
+
+    def test_with_total(self):
+        results = BatchRun(self.counts).run(self.users)
+        table = BatchRun.with_total(results)
+        self.assertEqual(list(table)[-1], 'all users')
+        self.assertEqual(table['all users'], {'fr': 13, 'ja': 3})
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from rattle_cli.benchmarks import suite
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_create_pages(self):
+        pages = suite.create_pages(450)
+        self.assertEqual(len(pages), 3)
+        books = suite.Goodreads(suite.FakeSession(pages)).get_books()
+        self.assertEqual(len(books), 450)
+
+    def test_run_suite(self):
+        results = suite.run_suite([30], repeat=1)
+        self.assertEqual(list(results.keys()),
+                         ["%s/30" % name for name in suite.BENCHMARKS])
+        for result in results.values():
+            self.assertGreater(result['reviews_per_second'], 0)
+            self.assertGreater(result['peak_memory'], 0)
+
+    def test_find_regressions(self):
+        baseline = {'get_books/10': {'reviews_per_second': 1000,
+                                     'peak_memory': 1000},
+                    'parse_author/10': {'reviews_per_second': 1000,
+                                        'peak_memory': 1000}}
+        results = {'get_books/10': {'reviews_per_second': 850,
+                                    'peak_memory': 1300},
+                   'parse_author/10': {'reviews_per_second': 700,
+                                       'peak_memory': 1100},
+                   'parse_shelves/10': {'reviews_per_second': 1,
+                                        'peak_memory': 1}}
+
+        regressions = suite.find_regressions(results, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("get_books/10: 1300 bytes"))
+        self.assertTrue(regressions[1].startswith("parse_author/10: 700"))
@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
 import datetime
+import io
 import unittest
+from unittest import mock
 
-from rattle_cli.bookarranger import BookArranger
+from rattle_cli.bookarranger import (BookArranger, ColumnarBookArranger,
+                                     LanguageCounter, ShelfSetCounter)
 from rattle_cli.goodreads import Book
 
 
@@ -175,3 +179,335 @@ class TestBookArrangerLangYearSort(unittest.TestCase):
                                          year=2015)
         self.assertCountEqual(books.keys(), ['en'])
         self.assertEqual(len(books['en']), 0)
+
+
+class TestBookArrangerIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.books = [
+            Book(title="A book (1)", author="An author",
+                 date_read=datetime.date(2016, 4, 25),
+                 shelves=['read', 'en', 'fr']),
+            Book(title="A book (2)", author="An author",
+                 date_read=datetime.date(2015, 4, 25),
+                 shelves=['read', 'fr', 'en']),
+            Book(title="A book (3)", author="An author",
+                 date_read="Not a date",
+                 shelves=['read', 'fr']),
+            Book(title="A book (4)", author="An author",
+                 date_read=datetime.date(2016, 4, 25),
+                 shelves=['read', 'fr'])]
+
+        self.ba = BookArranger(self.books)
+
+    def test_indexes(self):
+        self.assertEqual(self.ba.shelf_index['fr'], {0, 1, 2, 3})
+        self.assertEqual(self.ba.shelf_index['en'], {0, 1})
+        self.assertEqual(self.ba.year_index[2016], {0, 3})
+        self.assertEqual(self.ba.year_index[2015], {1})
+
+    def test_first_language_wins(self):
+        books = self.ba.sort_by_language(languages=['en', 'fr'])
+        self.assertEqual(books['en'], self.books[:2])
+        self.assertEqual(books['fr'], self.books[2:])
+
+        books = self.ba.sort_by_language(languages=['fr', 'en'])
+        self.assertEqual(books['fr'], self.books)
+        self.assertEqual(books['en'], [])
+
+    def test_first_language_wins_with_year(self):
+        books = self.ba.sort_by_language(languages=['en', 'fr'],
+                                         other=True, year=2016)
+        self.assertEqual(books['en'], [self.books[0]])
+        self.assertEqual(books['fr'], [self.books[3]])
+        self.assertEqual(books['default'], [])
+
+    def test_same_language_twice(self):
+        books = self.ba.sort_by_language(languages=['en', 'en'])
+        self.assertEqual(books['en'], self.books[:2])
+
+    def test_add(self):
+        book = Book(title="A book (5)", author="An author",
+                    date_read=datetime.date(2015, 1, 1),
+                    shelves=['read', 'en'])
+        self.ba.add(book)
+        books = self.ba.sort_by_language(languages=['en'], year=2015)
+        self.assertEqual(books['en'], [self.books[1], book])
+
+
+class TestBookArrangerYearsSort(unittest.TestCase):
+
+    def setUp(self):
+        self.books = [
+            Book(title="A book (1)", author="An author",
+                 date_read=datetime.date(2016, 4, 25),
+                 shelves=['read', 'en']),
+            Book(title="A book (2)", author="An author",
+                 date_read=datetime.date(2015, 4, 25),
+                 shelves=['read', 'es']),
+            Book(title="A book (3)", author="An author",
+                 date_read=datetime.date(2016, 4, 25),
+                 shelves=['read', 'es', 'en']),
+            Book(title="A book (4)", author="An author",
+                 date_read="",
+                 shelves=['read', 'es']),
+            Book(title="A book (5)", author="An author",
+                 date_read=datetime.date(2013, 4, 25),
+                 shelves=['read', 'fr'])]
+
+        self.ba = BookArranger(self.books)
+
+    def test_all_years(self):
+        books = self.ba.sort_by_year_and_language(languages=['es', 'en'],
+                                                  other=True)
+        self.assertEqual(list(books.keys()), [2013, 2015, 2016])
+        self.assertEqual(books[2013], {'es': [], 'en': [],
+                                       'default': [self.books[4]]})
+        self.assertEqual(books[2015], {'es': [self.books[1]], 'en': [],
+                                       'default': []})
+        self.assertEqual(books[2016], {'es': [self.books[2]],
+                                       'en': [self.books[0]],
+                                       'default': []})
+
+    def test_same_as_sort_by_language(self):
+        books = self.ba.sort_by_year_and_language(languages=['en', 'es'],
+                                                  other=True,
+                                                  years=range(2012, 2018))
+        self.assertEqual(list(books.keys()), list(range(2012, 2018)))
+        for year in range(2012, 2018):
+            self.assertEqual(books[year], self.ba.sort_by_language(
+                languages=['en', 'es'], other=True, year=year))
+
+    def test_print_table(self):
+        books = self.ba.sort_by_year_and_language(languages=['es', 'en'],
+                                                  years=[2015, 2016])
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.ba.print_table_nicely(books)
+        self.assertEqual(stdout.getvalue().splitlines(), [
+            "Books read based on Goodreads reviews",
+            "       en   es",
+            "2015    0    1",
+            "2016    1    1"])
+
+
+class TestLanguageCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.books = [
+            Book(title="A book (1)", author="An author",
+                 date_read=datetime.date(2016, 4, 25),
+                 shelves=['read', 'en']),
+            Book(title="A book (2)", author="An author",
+                 date_read=datetime.date(2015, 4, 25),
+                 shelves=['read', 'es']),
+            Book(title="A book (3)", author="An author",
+                 date_read=datetime.date(2016, 4, 25),
+                 shelves=['read', 'es', 'en']),
+            Book(title="A book (4)", author="An author",
+                 date_read="",
+                 shelves=['read', 'es']),
+            Book(title="A book (5)", author="An author",
+                 date_read=datetime.date(2013, 4, 25),
+                 shelves=['read', 'fr'])]
+
+        self.ba = BookArranger(self.books)
+
+    def assertSameCounts(self, **kwargs):
+        counts = LanguageCounter(**kwargs).add_all(iter(self.books))
+        sorted_books = self.ba.sort_by_language(**kwargs)
+        self.assertEqual(counts, {lang: len(books)
+                                  for lang, books in sorted_books.items()})
+        return counts
+
+    def test_counts(self):
+        counts = self.assertSameCounts(languages=['en', 'es'])
+        self.assertEqual(counts, {'en': 2, 'es': 2})
+
+    def test_counts_other(self):
+        counts = self.assertSameCounts(languages=['es', 'en'], other=True,
+                                       other_label='xx')
+        self.assertEqual(counts, {'es': 3, 'en': 1, 'xx': 1})
+
+    def test_counts_year(self):
+        counts = self.assertSameCounts(languages=['es'], other=True,
+                                       year=2016)
+        self.assertEqual(counts, {'es': 1, 'default': 1})
+
+    def test_no_languages(self):
+        self.assertEqual(self.assertSameCounts(), {})
+
+    def test_print_counts(self):
+        counter = LanguageCounter(['es', 'en'], other=True)
+        counter.add_all(self.books)
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            counter.print_counts_nicely()
+
+        sorted_books = self.ba.sort_by_language(['es', 'en'], other=True)
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as expected:
+            self.ba.print_sorted_books_nicely(sorted_books)
+        self.assertEqual(stdout.getvalue(), expected.getvalue())
+
+    def test_print_table(self):
+        counts = OrderedDict([('alice', {'es': 2, 'en': 10}),
+                              ('bob', {'es': 1}),
+                              ('all users', {'es': 3, 'en': 10})])
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            LanguageCounter.print_table_nicely(counts)
+        self.assertEqual(stdout.getvalue().splitlines(), [
+            "Books read based on Goodreads reviews",
+            "            en   es",
+            "alice       10    2",
+            "bob          0    1",
+            "all users   10    3"])
+
+
+class TestShelfSetCounter(unittest.TestCase):
+
+    setUp = TestLanguageCounter.setUp
+
+    def assertSameCounts(self, **kwargs):
+        counter = ShelfSetCounter().add_all(self.books)
+        self.assertEqual(counter.count_by_language(**kwargs),
+                         LanguageCounter(**kwargs).add_all(self.books))
+
+    def test_counts(self):
+        self.assertSameCounts(languages=['en', 'es'])
+        self.assertSameCounts(languages=['es', 'en'], other=True,
+                              other_label='xx')
+        self.assertSameCounts(languages=['es'], other=True, year=2016)
+        self.assertSameCounts(languages=['es', 'fr'], other=True, year=2014)
+        self.assertSameCounts()
+
+    def test_counts_by_year(self):
+        counter = ShelfSetCounter().add_all(self.books)
+        for years in (None, [2014, 2015, 2016]):
+            counts = ColumnarBookArranger(
+                self.books).count_by_year_and_language(['es', 'en'], True,
+                                                       years=years)
+            self.assertEqual(counter.count_by_year_and_language(
+                ['es', 'en'], True, years=years), counts)
+
+    def test_entries(self):
+        counter = ShelfSetCounter().add_all(self.books)
+        entries = counter.to_entries()
+        self.assertIn([None, ['es', 'read'], 1], entries)
+        self.assertIn([2016, ['en', 'read'], 1], entries)
+        self.assertEqual(ShelfSetCounter.from_entries(entries).counts,
+                         counter.counts)
+
+
+# The columnar arranger must give the same results, so it goes through the
+# same tests
+
+class TestColumnarLangSort(TestBookArrangerLangSort):
+
+    def setUp(self):
+        super().setUp()
+        self.ba = ColumnarBookArranger(self.books)
+
+
+class TestColumnarLangYearSort(TestBookArrangerLangYearSort):
+
+    def setUp(self):
+        super().setUp()
+        self.ba = ColumnarBookArranger(self.books)
+
+
+class TestColumnarYearsSort(TestBookArrangerYearsSort):
+
+    def setUp(self):
+        super().setUp()
+        self.ba = ColumnarBookArranger(self.books)
+
+    def test_all_years(self):
+        books = self.ba.sort_by_year_and_language(languages=['es', 'en'],
+                                                  other=True)
+        self.assertEqual(list(books.keys()), [2013, 2015, 2016])
+        titles = {year: {lang: [book.title for book in books[year][lang]]
+                         for lang in books[year]} for year in books}
+        self.assertEqual(titles[2013], {'es': [], 'en': [],
+                                        'default': ["A book (5)"]})
+        self.assertEqual(titles[2016], {'es': ["A book (3)"],
+                                        'en': ["A book (1)"],
+                                        'default': []})
+
+
+class TestColumnarBookArranger(unittest.TestCase):
+
+    def setUp(self):
+        pacific = datetime.timezone(datetime.timedelta(hours=-8))
+        self.books = [
+            Book(title="A book (%d)" % n, author="Author #%d" % (n % 3),
+                 date_read=datetime.datetime(2010 + n % 4, 12, 31, 23, 30,
+                                             tzinfo=pacific),
+                 shelves=['read', ['en', 'es', 'fr'][n % 3]])
+            for n in range(100)]
+        self.books.append(Book(title="Undated", author="Author #0",
+                               date_read="", shelves=['read', 'en']))
+        self.books.append(Book(title="Odd date", author="Author #0",
+                               date_read="Someday", shelves=['read']))
+        self.books.append(Book(title="Estimated", author="Author #1",
+                               date_read=datetime.datetime(2012, 1, 1),
+                               shelves=['read'], date_read_estimated=True))
+        self.columns = ColumnarBookArranger(self.books)
+        self.arranger = BookArranger(self.books)
+
+    def titles(self, books):
+        return {lang: [book.title for book in books[lang]] for lang in books}
+
+    def test_columns(self):
+        self.assertEqual(len(self.columns), 103)
+        self.assertEqual(len(self.columns.authors), 3)
+        self.assertEqual(len(self.columns.shelf_sets), 4)
+        self.assertEqual(self.columns.dates.typecode, 'q')
+
+    def test_same_as_book_arranger(self):
+        for year in [None, 2010, 2011, 2012, 2013, 2020]:
+            for other in [False, True]:
+                args = (['es', 'en'], other, 'default', year)
+                self.assertEqual(
+                    self.titles(self.columns.sort_by_language(*args)),
+                    self.titles(self.arranger.sort_by_language(*args)))
+                self.assertEqual(
+                    self.columns.count_by_language(*args),
+                    {lang: len(books) for lang, books in
+                     self.arranger.sort_by_language(*args).items()})
+
+    def test_count_by_year_and_language(self):
+        counts = self.columns.count_by_year_and_language(['fr', 'en'], True)
+        books = self.arranger.sort_by_year_and_language(['fr', 'en'], True)
+        self.assertEqual(list(counts), [2010, 2011, 2012, 2013])
+        self.assertEqual(counts, OrderedDict(
+            (year, {lang: len(books[year][lang]) for lang in books[year]})
+            for year in books))
+
+    def test_views_keep_dates(self):
+        books = {book.title: book for book in
+                 self.columns.sort_by_language(other=True)['default']}
+        original = self.books[5].date_read
+        self.assertEqual(books["A book (5)"].date_read, original)
+        self.assertEqual(books["A book (5)"].date_read.utcoffset(),
+                         original.utcoffset())
+        self.assertEqual(books["A book (5)"].date_read.year, 2011)
+        self.assertEqual(books["Undated"].date_read, "")
+        self.assertEqual(books["Odd date"].date_read, "Someday")
+        self.assertTrue(books["Estimated"].date_read_estimated)
+        self.assertEqual(books["A book (5)"].shelves, {'read', 'fr'})
+
+    def test_views_are_reused(self):
+        first = self.columns.sort_by_language(['en'])['en']
+        second = self.columns.sort_by_language(['en'], year=2010)['en']
+        self.assertIs(second[0], first[0])
+
+    def test_add_after_query(self):
+        self.columns.count_by_language(['en'])
+        self.columns.add(Book(title="New", author="Author #0",
+                              date_read=datetime.datetime(2010, 6, 1),
+                              shelves=['read', 'en']))
+        self.assertEqual(self.columns.count_by_language(['en'])['en'], 36)
+
+    def test_positions(self):
+        self.assertEqual(
+            list(ColumnarBookArranger.positions(0b1000000100101)),
+            [0, 2, 5, 12])
+        self.assertEqual(list(ColumnarBookArranger.positions(0)), [])
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from rattle_cli.data_sources import CSVExportSource, XMLPagesSource
+from rattle_cli.goodreads import Goodreads
+from rattle_cli.tests.xml_fixtures import GoodreadsXMLFactory
+
+
+class TestXMLPagesSource(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.xml_factory = GoodreadsXMLFactory()
+        self.filenames = []
+        for start, end in [(1, 4), (5, 7)]:
+            self.filenames.append(self.save(
+                'page%s.xml' % start,
+                self.xml_factory.create_full_xml_response(
+                    reviews=7, authors=2, shelves=2, start_cnt=start,
+                    end_cnt=end)))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def save(self, name, content):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return filename
+
+    def test_pages(self):
+        goodreads = Goodreads(None, source=XMLPagesSource(self.filenames))
+        books = goodreads.get_books()
+        self.assertEqual([book.title for book in books],
+                         ["Wonderful Book Title %d" % n for n in range(7)])
+        self.assertEqual(books[0].author, "Author #0, Author #1")
+        self.assertEqual(books[0].shelves, {"Self #0", "Self #1"})
+
+    def test_same_as_api(self):
+        goodreads = Goodreads(mock.Mock())
+        with open(self.filenames[0], 'rb') as f:
+            goodreads.session.post.return_value.content = f.read()
+        _, _, expected = goodreads.retrieve_page()
+        books = list(XMLPagesSource(self.filenames[:1]).iter_books(goodreads))
+        self.assertEqual([book.to_record() for book in books],
+                         [book.to_record() for book in expected])
+
+    def test_small_chunks(self):
+        goodreads = Goodreads(None, source=XMLPagesSource(self.filenames))
+        goodreads.chunk_size = 100
+        self.assertEqual(len(goodreads.get_books()), 7)
+
+    def test_empty_file(self):
+        empty = self.save('empty.xml', '')
+        goodreads = Goodreads(None, source=XMLPagesSource([empty]))
+        self.assertEqual(goodreads.get_books(), [])
+
+    def test_process_pool(self):
+        empty = self.save('empty.xml', '')
+        source = XMLPagesSource(self.filenames + [empty], jobs=2)
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            books = Goodreads(None, source=source, pool=pool).get_books()
+        self.assertEqual([book.title for book in books],
+                         ["Wonderful Book Title %d" % n for n in range(7)])
+
+
+class TestCSVExportSource(unittest.TestCase):
+
+    export = (
+        "Book Id,Title,Author,Author l-f,Additional Authors,ISBN,My Rating,"
+        "Date Read,Date Added,Bookshelves,Exclusive Shelf,My Review\n"
+        "1,Vol de nuit,Antoine de Saint-Exupéry,,,\"=\"\"\"\"\",4,"
+        "2016/03/04,2016/01/01,fr,read,\"Short, but\nvery good\"\n"
+        "2,The Final Empire,Brandon Sanderson,,,,0,,2015/02/02,,read,\n"
+        "3,陽気なギャングが地球を回す,Kotaro Isaka,,\"Someone, Else\",,0,"
+        "2016/05/05,2016/05/01,\"ja, favourites\",read,\n"
+        "4,Later,Someone,,,,0,,2016/05/01,fr,to-read,\n")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'export.csv')
+        with open(self.filename, 'w', encoding='utf-8-sig') as f:
+            f.write(self.export)
+        self.goodreads = Goodreads(None,
+                                   source=CSVExportSource(self.filename))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_books(self):
+        books = self.goodreads.get_books()
+        self.assertEqual([book.title for book in books],
+                         ["Vol de nuit", "The Final Empire",
+                          "陽気なギャングが地球を回す"])
+        self.assertEqual(books[0].review_id, "1")
+        self.assertEqual(books[0].author, "Antoine de Saint-Exupéry")
+        self.assertEqual(books[0].shelves, {"read", "fr"})
+        self.assertEqual(books[2].author, "Kotaro Isaka, Someone, Else")
+        self.assertEqual(books[2].shelves, {"read", "ja", "favourites"})
+
+    def test_dates(self):
+        books = self.goodreads.get_books()
+        self.assertEqual(books[0].date_read,
+                         datetime.datetime(2016, 3, 4,
+                                           tzinfo=datetime.timezone.utc))
+        self.assertFalse(books[0].date_read_estimated)
+        # Falls back on the date added, like on the updated date for the API
+        self.assertEqual(books[1].date_read.date(), datetime.date(2015, 2, 2))
+        self.assertTrue(books[1].date_read_estimated)
+
+    def test_exclusive_shelf(self):
+        books = self.goodreads.get_books("to-read")
+        self.assertEqual([book.title for book in books], ["Later"])
+
+    def test_shelves_at_once(self):
+        books = self.goodreads.get_books_by_shelf(["read", "to-read"])
+        self.assertEqual([len(shelf) for shelf in books.values()], [3, 1])
+
+    def test_empty_file(self):
+        open(self.filename, 'w').close()
+        self.assertEqual(self.goodreads.get_books(), [])
+
+    def test_fingerprint(self):
+        source = CSVExportSource(self.filename)
+        fingerprint = source.fingerprint()
+        self.assertEqual(source.fingerprint(), fingerprint)
+        with open(self.filename, 'a', encoding='utf-8') as f:
+            f.write("5,Another,Someone,,,,0,,2016/05/01,,read,\n")
+        self.assertNotEqual(source.fingerprint(), fingerprint)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rattle_cli.fetch_journal import FetchJournal
+
+
+class TestFetchJournal(unittest.TestCase):
+
+    records = [("1", "Book #1", "An author", "", "", ["read", "fr"]),
+               ("2", "Book #2", "村上春樹", "", "", ["read"])]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def interrupted_download(self):
+        journal = FetchJournal(self.filename)
+        self.assertEqual(journal.open("1234", "read", 40, 20), {})
+        journal.add(1, self.records)
+        journal.close(complete=False)
+
+    def test_resume(self):
+        self.interrupted_download()
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(journal.open("1234", "read", 40, 20),
+                         {1: self.records})
+        journal.add(2, self.records[:1])
+        journal.close(complete=False)
+
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(journal.open("1234", "read", 40, 20),
+                         {1: self.records, 2: self.records[:1]})
+
+    def test_no_resume(self):
+        self.interrupted_download()
+        journal = FetchJournal(self.filename)
+        self.assertEqual(journal.open("1234", "read", 40, 20), {})
+
+    def test_total_changed(self):
+        self.interrupted_download()
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(journal.open("1234", "read", 41, 20), {})
+        journal.close(complete=False)
+
+        # The old pages are gone for good
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(journal.open("1234", "read", 40, 20), {})
+
+    def test_other_shelf_or_user(self):
+        self.interrupted_download()
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(journal.open("1234", "to-read", 40, 20), {})
+        self.interrupted_download()
+        self.assertEqual(journal.open("5678", "read", 40, 20), {})
+
+    def test_half_written_page(self):
+        self.interrupted_download()
+        with open(self.filename, 'a') as f:
+            f.write('{"page": 2, "reco')
+
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(journal.open("1234", "read", 40, 20),
+                         {1: self.records})
+        journal.add(2, self.records)
+        journal.close(complete=False)
+
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(len(journal.open("1234", "read", 40, 20)), 2)
+
+    def test_complete(self):
+        journal = FetchJournal(self.filename)
+        journal.open("1234", "read", 40, 20)
+        journal.close()
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_missing_file(self):
+        journal = FetchJournal(self.filename, resume=True)
+        self.assertEqual(journal.open("1234", "read", 40, 20), {})
@@ -1,14 +1,34 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 from unittest import mock
 
-from rattle_cli.goodreads import Book, Goodreads
+from rattle_cli.async_session import AsyncGoodreadsSession
+from rattle_cli.fetch_journal import FetchJournal
+from rattle_cli.goodreads import (Book, DATE_FORMAT, Goodreads, parse_date,
+                                  parse_page, ReviewStream)
+from rattle_cli.profiling import Stats
+from rattle_cli.review_store import ReviewStore
+from rattle_cli.tests.stub_server import StubGoodreadsServer
 from rattle_cli.tests.xml_fixtures import GoodreadsXMLFactory
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 
 class TestUser(unittest.TestCase):
 
@@ -181,6 +201,49 @@ class TestReviewParsing(unittest.TestCase):
         self.assertEqual(result, [])
 
 
+class TestDateParsing(unittest.TestCase):
+
+    def test_same_as_strptime(self):
+        xml_factory = GoodreadsXMLFactory()
+        start = datetime.datetime(2001, 1, 1, 8, 30, 15,
+                                  tzinfo=GoodreadsXMLFactory.goodreads_tz)
+        for days in range(0, 8000, 13):
+            value = xml_factory.create_read_at_date(
+                start + datetime.timedelta(days=days, seconds=days * 37))
+            self.assertEqual(parse_date(value),
+                             datetime.datetime.strptime(value, DATE_FORMAT))
+
+    def test_timezones(self):
+        for value in ("Fri Mar 04 00:00:00 +0000 2016",
+                      "Fri Mar 04 00:00:00 +0530 2016",
+                      "Fri Mar 04 23:59:59 -0930 2016"):
+            result = parse_date(value)
+            self.assertEqual(result,
+                             datetime.datetime.strptime(value, DATE_FORMAT))
+            self.assertEqual(result.utcoffset(),
+                             datetime.datetime.strptime(
+                                 value, DATE_FORMAT).utcoffset())
+
+    def test_fallback(self):
+        for value in ("Fri Mar 4 00:00:00 -0800 2016",
+                      "fri mar 04 00:00:00 -0800 2016"):
+            self.assertEqual(parse_date(value),
+                             datetime.datetime.strptime(value, DATE_FORMAT))
+
+    def test_invalid(self):
+        for value in ("This is not a date",
+                      "Fri Feb 30 00:00:00 -0800 2016",
+                      "Fri Mar 04 00:00:00 -0800 +016",
+                      "Fri Abc 04 00:00:00 -0800 2016",
+                      ""):
+            with self.assertRaises(ValueError):
+                parse_date(value)
+
+    def test_not_a_string(self):
+        with self.assertRaises(TypeError):
+            parse_date(None)
+
+
 class TestReviewRetrieval(unittest.TestCase):
 
     book_title = "Wonderful Book Title %d"
@@ -339,3 +402,900 @@ class TestReviewRetrieval(unittest.TestCase):
         result = self.goodreads.get_books()
         self.assertIsInstance(result, list)
         self.assertEqual(len(result), review_count)
+
+    def test_get_books_concurrently_keeps_page_order(self):
+        review_count = 40
+        first_date = datetime.datetime(2018, 6, 1,
+                                       tzinfo=datetime.timezone.utc)
+
+        def fake_post(url, data):
+            page = data['page']
+            if page > 8:
+                self.fail("Called with page number %d" % page)
+
+            # Later pages come back first
+            time.sleep((8 - page) * 0.005)
+            response = mock.Mock()
+            response.content = self.xml_factory.create_full_xml_response(
+                reviews=review_count,
+                d=first_date - datetime.timedelta(days=page),
+                start_cnt=(page-1) * 5 + 1,
+                end_cnt=page * 5)
+            return response
+
+        self.goodreads.session.post = fake_post
+
+        result = self.goodreads.get_books(jobs=4)
+        self.assertEqual(len(result), review_count)
+        dates = [book.date_read for book in result]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertEqual(dates[-1], first_date - datetime.timedelta(days=8))
+
+    def test_get_books_concurrently_single_page(self):
+        response = mock.Mock()
+        response.content = self.xml_factory.create_full_xml_response(
+            reviews=3)
+        self.goodreads.session.post.return_value = response
+
+        result = self.goodreads.get_books(jobs=4)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(self.goodreads.session.post.call_count, 1)
+
+
+class TestReviewSync(unittest.TestCase):
+
+    def setUp(self):
+        session = mock.Mock()
+        self.goodreads = Goodreads(session)
+        self.xml_factory = GoodreadsXMLFactory()
+        self.store = ReviewStore(':memory:')
+        self.pages = []
+        self.date_updated = datetime.datetime(
+            2018, 2, 15, 13, 54, 37, tzinfo=GoodreadsXMLFactory.goodreads_tz)
+
+    def tearDown(self):
+        self.store.close()
+
+    def fake_post(self, review_count, per_page=5):
+        def fake_post(url, data):
+            page = data['page']
+            self.pages.append(page)
+            start = (page-1) * per_page + 1
+            end = min(page * per_page, review_count)
+            if start > end:
+                self.fail("Called with page number %d" % page)
+
+            response = mock.Mock()
+            response.content = self.xml_factory.create_full_xml_response(
+                reviews=review_count,
+                d=self.date_updated,
+                start_cnt=start,
+                end_cnt=end)
+            return response
+        return fake_post
+
+    def test_get_books_fills_the_store(self):
+        self.goodreads.session.post = self.fake_post(12)
+
+        result = self.goodreads.get_books(store=self.store)
+        self.assertEqual(len(result), 12)
+        self.assertEqual(self.pages, [1, 2, 3])
+        self.assertEqual(self.store.count('read'), 12)
+
+    def test_get_books_from_the_store(self):
+        self.goodreads.session.post = self.fake_post(12)
+        expected = self.goodreads.get_books(store=self.store)
+
+        self.pages = []
+        goodreads = Goodreads(self.goodreads.session)
+        result = goodreads.get_books(store=self.store)
+        self.assertEqual(self.pages, [1])
+        self.assertEqual([book.title for book in result],
+                         [book.title for book in expected])
+        self.assertEqual([book.date_read for book in result],
+                         [book.date_read for book in expected])
+        self.assertIsInstance(result[0].date_read, datetime.datetime)
+
+    def test_get_books_new_reviews_only(self):
+        # The 5 most recent reviews weren't there the first time around
+        self.store.replace('read', [
+            Book("Wonderful Book Title %d" % n, "Author #0",
+                 review_id=str(1234567890 + n),
+                 date_updated=self.xml_factory.create_read_at_date(
+                     self.date_updated),
+                 shelves=["Self #0"]).to_record()
+            for n in range(5, 12)])
+        self.goodreads.session.post = self.fake_post(12)
+
+        with mock.patch.object(self.store, 'is_current',
+                               side_effect=lambda review_id, _:
+                               int(review_id) >= 1234567890 + 5):
+            result = self.goodreads.get_books(store=self.store)
+        self.assertEqual(self.pages, [1, 2])
+        self.assertEqual([book.title for book in result],
+                         ["Wonderful Book Title %d" % n for n in range(12)])
+
+    def test_get_books_total_changed(self):
+        self.goodreads.session.post = self.fake_post(12)
+        self.goodreads.get_books(store=self.store)
+
+        # One review was deleted, so the whole shelf is fetched again
+        self.pages = []
+        self.goodreads.session.post = self.fake_post(11)
+        result = Goodreads(self.goodreads.session).get_books(store=self.store)
+        self.assertEqual(self.pages, [1, 1, 2, 3])
+        self.assertEqual(len(result), 11)
+        self.assertEqual(self.store.count('read'), 11)
+
+    def test_already_synced(self):
+        self.goodreads.session.post = self.fake_post(12)
+        self.goodreads.get_books(store=self.store)
+
+        self.pages = []
+        self.goodreads.session.post = self.fake_post(11)
+        goodreads = Goodreads(self.goodreads.session)
+        self.assertFalse(goodreads.sync_books('read', self.store))
+        books = list(goodreads.iter_books(store=self.store, sync=False))
+        self.assertEqual(self.pages, [1, 1, 2, 3])
+        self.assertEqual(len(books), 11)
+
+
+class TestReviewStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        self.goodreads = Goodreads(self.session, streaming=True)
+        self.xml_factory = GoodreadsXMLFactory()
+
+    def chunks(self, xml, size=100):
+        xml = xml.encode('utf-8')
+        return [xml[i:i + size] for i in range(0, len(xml), size)]
+
+    def assertSameBooks(self, xml):
+        response = mock.Mock()
+        response.content = xml
+        response.iter_content.return_value = self.chunks(xml)
+        self.session.post.return_value = response
+
+        expected = Goodreads(self.session).get_books()
+        result = self.goodreads.get_books()
+        self.assertEqual(len(result), len(expected))
+        for book, expected_book in zip(result, expected):
+            self.assertEqual(book.title, expected_book.title)
+            self.assertEqual(book.author, expected_book.author)
+            self.assertEqual(book.date_read, expected_book.date_read)
+            self.assertCountEqual(book.shelves, expected_book.shelves)
+            self.assertEqual(book.review_id, expected_book.review_id)
+            self.assertEqual(book.date_updated, expected_book.date_updated)
+        return result
+
+    def test_stream_one_review(self):
+        xml = self.xml_factory.create_full_xml_response()
+        result = self.assertSameBooks(xml)
+        self.assertEqual(len(result), 1)
+
+    def test_stream_multiple_reviews(self):
+        xml = self.xml_factory.create_full_xml_response(reviews=10,
+                                                        authors=2,
+                                                        shelves=3)
+        result = self.assertSameBooks(xml)
+        self.assertEqual(result[1].author, "Author #0, Author #1")
+        self.assertEqual(len(result[1].shelves), 3)
+        _, kwargs = self.session.post.call_args
+        self.assertTrue(kwargs['stream'])
+
+    def test_stream_no_authors_or_shelves(self):
+        xml = self.xml_factory.create_full_xml_response(reviews=2,
+                                                        authors=0,
+                                                        shelves=0)
+        result = self.assertSameBooks(xml)
+        self.assertEqual(result[0].author, "")
+        self.assertEqual(len(result[0].shelves), 0)
+
+    def test_stream_no_read_at(self):
+        xml = self.xml_factory.create_full_xml_response(reviews=2)
+        xml = re.sub("<read_at>.*</read_at>", "<read_at></read_at>", xml)
+        result = self.assertSameBooks(xml)
+        self.assertIsInstance(result[0].date_read, datetime.datetime)
+
+    def test_stream_multiple_pages(self):
+        review_count = 12
+
+        def fake_post(url, data, stream=False):
+            page = data['page']
+            if page > 3:
+                self.fail("Called with page number %d" % page)
+
+            response = mock.Mock()
+            response.iter_content.return_value = self.chunks(
+                self.xml_factory.create_full_xml_response(
+                    reviews=review_count,
+                    start_cnt=(page-1) * 5 + 1,
+                    end_cnt=min(page * 5, review_count)))
+            return response
+
+        self.session.post = fake_post
+        result = self.goodreads.get_books()
+        self.assertEqual([book.title for book in result],
+                         ["Wonderful Book Title %d" % n
+                          for n in range(review_count)])
+
+    def test_stream_elements_are_dropped(self):
+        xml = self.xml_factory.create_full_xml_response(reviews=5)
+        stream = ReviewStream(self.goodreads, self.chunks(xml))
+        self.assertEqual(stream.read_counts(), (5, 5))
+        for book in stream:
+            # Only the reviews parsed but not handed out yet, and the one
+            # being read, are kept around
+            self.assertLessEqual(len(stream.reviews), len(stream.pending) + 1)
+        self.assertEqual(len(stream.reviews), 0)
+
+    def test_stream_no_reviews(self):
+        stream = ReviewStream(self.goodreads, self.chunks(
+            "<GoodreadsResponse><Request/></GoodreadsResponse>"))
+        with self.assertRaises(ValueError):
+            stream.read_counts()
+
+
+class TestBook(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        book = Book("Title", "Author")
+        self.assertFalse(hasattr(book, '__dict__'))
+        with self.assertRaises(AttributeError):
+            book.language = 'fr'
+
+    def test_shelves(self):
+        book = Book("Title", "Author", shelves=['read', 'fr'])
+        self.assertIsInstance(book.shelves, frozenset)
+        self.assertIn('fr', book.shelves)
+        self.assertNotIn('ja', book.shelves)
+        self.assertCountEqual(book.shelves, ['read', 'fr'])
+
+    def test_no_shelves(self):
+        book = Book("Title", "Author")
+        self.assertEqual(book.shelves, frozenset())
+
+    def test_shelves_are_shared(self):
+        first = Book("Title", "Author", shelves=['read', 'fr'])
+        second = Book("Title", "Author", shelves=['fr', ''.join('read')])
+        self.assertIs(first.shelves, second.shelves)
+
+    def test_shelf_names_are_interned(self):
+        name = ''.join(['ja', 'pan', 'ese'])
+        book = Book("Title", "Author", shelves=[name])
+        self.assertIs(next(iter(book.shelves)), 'japanese')
+
+    def test_record(self):
+        date_read = datetime.datetime(2016, 3, 4,
+                                      tzinfo=GoodreadsXMLFactory.goodreads_tz)
+        book = Book("Title", "Author", date_read, ['read', 'fr'],
+                    review_id="123", date_updated="Whenever")
+        record = book.to_record()
+        self.assertEqual(record, ("123", "Title", "Author",
+                                  "Fri Mar 04 00:00:00 -0800 2016",
+                                  "Whenever", ['fr', 'read']))
+
+        copy = Book.from_record(record)
+        self.assertEqual(copy.date_read, date_read)
+        self.assertIs(copy.shelves, book.shelves)
+
+
+class TestResumedDownload(unittest.TestCase):
+
+    review_count = 20
+
+    def setUp(self):
+        self.goodreads = Goodreads(mock.Mock())
+        self.xml_factory = GoodreadsXMLFactory()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'journal')
+        self.pages = []
+        self.fail_on = None
+        self.goodreads.session.post = self.fake_post
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fake_post(self, url, data):
+        page = data['page']
+        self.pages.append(page)
+        if page == self.fail_on:
+            raise ConnectionError("Page %d went missing" % page)
+
+        response = mock.Mock()
+        response.content = self.xml_factory.create_full_xml_response(
+            reviews=self.review_count,
+            start_cnt=(page-1) * 5 + 1,
+            end_cnt=page * 5)
+        return response
+
+    def test_resume(self):
+        self.fail_on = 3
+        with self.assertRaises(ConnectionError):
+            self.goodreads.get_books(journal=FetchJournal(self.filename))
+
+        self.pages = []
+        self.fail_on = None
+        result = Goodreads(self.goodreads.session).get_books(
+            journal=FetchJournal(self.filename, resume=True))
+        self.assertEqual(self.pages, [1, 3, 4])
+        self.assertEqual([book.title for book in result],
+                         ["Wonderful Book Title %d" % n
+                          for n in range(self.review_count)])
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_resume_concurrently(self):
+        self.fail_on = 4
+        with self.assertRaises(ConnectionError):
+            self.goodreads.get_books(jobs=2,
+                                     journal=FetchJournal(self.filename))
+
+        self.pages = []
+        self.fail_on = None
+        result = Goodreads(self.goodreads.session).get_books(
+            jobs=2, journal=FetchJournal(self.filename, resume=True))
+        self.assertEqual(sorted(self.pages), [1, 4])
+        self.assertEqual(len(result), self.review_count)
+
+    def test_total_changed(self):
+        self.fail_on = 3
+        with self.assertRaises(ConnectionError):
+            self.goodreads.get_books(journal=FetchJournal(self.filename))
+
+        self.pages = []
+        self.fail_on = None
+        self.review_count = 25
+        result = Goodreads(self.goodreads.session).get_books(
+            journal=FetchJournal(self.filename, resume=True))
+        self.assertEqual(self.pages, [1, 2, 3, 4, 5])
+        self.assertEqual(len(result), self.review_count)
+
+
+class TestIterBooks(unittest.TestCase):
+
+    def setUp(self):
+        self.goodreads = Goodreads(mock.Mock())
+        self.xml_factory = GoodreadsXMLFactory()
+        self.pages = []
+        self.goodreads.session.post = self.fake_post
+
+    def fake_post(self, url, data):
+        page = data['page']
+        self.pages.append(page)
+        response = mock.Mock()
+        response.content = self.xml_factory.create_full_xml_response(
+            reviews=15,
+            start_cnt=(page-1) * 5 + 1,
+            end_cnt=page * 5)
+        return response
+
+    def test_books_come_page_by_page(self):
+        books = self.goodreads.iter_books()
+        self.assertEqual(self.pages, [])
+
+        first = [next(books) for _ in range(5)]
+        self.assertEqual(self.pages, [1])
+        self.assertEqual(first[0].title, "Wonderful Book Title 0")
+
+        next(books)
+        self.assertEqual(self.pages, [1, 2])
+        self.assertEqual(len(list(books)), 9)
+        self.assertEqual(self.pages, [1, 2, 3])
+
+    def test_books_are_not_kept(self):
+        self.assertEqual(len(list(self.goodreads.iter_books())), 15)
+        self.assertEqual(self.goodreads.books, [])
+
+    def test_store_is_filled_page_by_page(self):
+        store = ReviewStore(':memory:')
+        books = self.goodreads.iter_books(store=store)
+        [next(books) for _ in range(6)]
+        self.assertEqual(store.count('read'), 10)
+        list(books)
+        self.assertEqual(store.count('read'), 15)
+        store.close()
+
+
+class TestYearFilteredDownload(unittest.TestCase):
+
+    review_count = 50
+
+    def setUp(self):
+        self.goodreads = Goodreads(mock.Mock())
+        self.xml_factory = GoodreadsXMLFactory()
+        self.pages = []
+        self.undated = set()
+        self.goodreads.session.post = self.fake_post
+
+    def fake_post(self, url, data):
+        # One page per year, from 2020 backwards
+        page = data['page']
+        self.pages.append(page)
+        self.assertEqual(data['order'], 'd')
+        response = mock.Mock()
+        response.content = self.xml_factory.create_full_xml_response(
+            reviews=self.review_count,
+            d=datetime.datetime(2021 - page, 6, 1,
+                                tzinfo=GoodreadsXMLFactory.goodreads_tz),
+            start_cnt=(page-1) * 5 + 1,
+            end_cnt=page * 5)
+        if page in self.undated:
+            response.content = re.sub("<read_at>.*</read_at>",
+                                      "<read_at></read_at>", response.content)
+        return response
+
+    def test_stop_at_older_page(self):
+        books = self.goodreads.get_books(year=2018)
+        self.assertEqual(self.pages, [1, 2, 3, 4, 10])
+        self.assertEqual(len(books), 20)
+        self.assertEqual(books[-1].date_read.year, 2017)
+
+    def test_stop_at_first_page(self):
+        books = self.goodreads.get_books(year=2021)
+        self.assertEqual(self.pages, [1, 10])
+        self.assertEqual(len(books), 5)
+
+    def test_no_year(self):
+        books = self.goodreads.get_books()
+        self.assertEqual(self.pages, list(range(1, 11)))
+        self.assertEqual(len(books), self.review_count)
+
+    def test_year_before_everything(self):
+        self.goodreads.get_books(year=2000)
+        self.assertEqual(self.pages, list(range(1, 11)))
+
+    def test_store_kept_when_stopping_early(self):
+        store = ReviewStore(':memory:')
+        list(self.goodreads.iter_books(store=store))
+        store.prepend('read', [('999', 'Deleted', 'Someone', '', '',
+                                ['read'])])
+        self.pages = []
+        books = list(self.goodreads.iter_books(store=store, year=2018))
+        self.assertEqual(len(books), 20)
+        # Not current any more, but not cut down to the first pages either
+        self.assertEqual(store.count('read'), self.review_count + 1)
+        store.close()
+
+    def test_store_filled_when_not_stopping(self):
+        store = ReviewStore(':memory:')
+        list(self.goodreads.iter_books(store=store, year=2018))
+        self.assertEqual(store.count('read'), 0)
+        list(self.goodreads.iter_books(store=store, year=2000))
+        self.assertEqual(store.count('read'), self.review_count)
+        self.pages = []
+        books = list(self.goodreads.iter_books(store=store, year=2018))
+        self.assertEqual(len(books), self.review_count)
+        self.assertEqual(self.pages, [1])
+        store.close()
+
+    def test_undated_books_at_the_end(self):
+        self.undated = {9, 10}
+        books = self.goodreads.get_books(year=2018)
+        self.assertEqual(self.pages, [1, 2, 3, 4, 10, 9, 8])
+        self.assertEqual(len(books), 30)
+        self.assertTrue(all(book.date_read_estimated for book in books[20:]))
+        self.assertEqual([book.title for book in books[20:]],
+                         ["Wonderful Book Title %d" % n
+                          for n in range(40, 50)])
+
+    def test_undated_books_dont_stop_download(self):
+        self.undated = {4}
+        self.goodreads.get_books(year=2018)
+        self.assertEqual(self.pages, [1, 2, 3, 4, 5, 10])
+
+    def test_stop_concurrently(self):
+        lock = threading.Lock()
+        fake_post = self.fake_post
+
+        def locked_post(url, data):
+            with lock:
+                return fake_post(url, data)
+
+        self.goodreads.session.post = locked_post
+        books = self.goodreads.get_books(jobs=2, year=2018)
+        self.assertEqual(len(books), 20)
+        # Up to two pages past page 4 may have been requested already
+        self.assertEqual(self.pages[:4], [1, 2, 3, 4])
+        self.assertEqual(self.pages[-1], 10)
+        self.assertNotIn(7, self.pages)
+
+    def test_estimated_dates_in_records(self):
+        self.undated = {1}
+        book = self.goodreads.get_books(year=2021)[0]
+        self.assertTrue(book.date_read_estimated)
+        record = book.to_record()
+        self.assertEqual(record[3], "")
+
+        copy = Book.from_record(record)
+        self.assertTrue(copy.date_read_estimated)
+        self.assertEqual(copy.date_read, book.date_read)
+
+
+class TestPageSize(unittest.TestCase):
+
+    review_count = 500
+
+    def setUp(self):
+        self.goodreads = Goodreads(mock.Mock())
+        self.xml_factory = GoodreadsXMLFactory()
+        self.now = 0.0
+        self.latency = lambda per_page: 1
+        self.requests = []
+        self.cached = []
+        self.goodreads.session.post = self.fake_post
+
+    def fake_post(self, url, data, cached=True):
+        per_page, page = data['per_page'], data['page']
+        self.requests.append((per_page, page))
+        self.cached.append(cached)
+        self.now += self.latency(per_page)
+        response = mock.Mock()
+        response.content = self.xml_factory.create_full_xml_response(
+            reviews=self.review_count,
+            start_cnt=(page-1) * per_page + 1,
+            end_cnt=min(page * per_page, self.review_count))
+        return response
+
+    def autotune(self):
+        with mock.patch('rattle_cli.goodreads.time.perf_counter',
+                        side_effect=lambda: self.now):
+            return self.goodreads.autotune_per_page()
+
+    def test_default_per_page(self):
+        self.goodreads.get_books()
+        self.assertEqual(self.requests, [(200, 1), (200, 2), (200, 3)])
+
+    def test_per_page(self):
+        goodreads = Goodreads(self.goodreads.session, per_page=100)
+        self.assertEqual(len(goodreads.get_books()), self.review_count)
+        self.assertEqual([page for _, page in self.requests],
+                         [1, 2, 3, 4, 5])
+
+    def test_autotune_large_pages(self):
+        self.latency = lambda per_page: 1 + per_page * 0.001
+        self.assertEqual(self.autotune(), 200)
+        self.assertEqual(self.goodreads.per_page, 200)
+        self.assertEqual(self.requests,
+                         [(200, 1), (100, 1), (50, 1), (20, 1)])
+
+    def test_autotune_slow_large_pages(self):
+        self.latency = lambda per_page: 0.1 + per_page * 0.05
+        self.assertEqual(self.autotune(), 100)
+
+    def test_autotune_small_shelf(self):
+        self.review_count = 150
+        self.assertEqual(self.autotune(), 200)
+        self.assertEqual(self.requests, [(200, 1)])
+
+    def test_autotune_skips_cache(self):
+        self.autotune()
+        self.assertEqual(self.cached, [False] * 4)
+
+    def test_autotune_first_page_reused(self):
+        self.latency = lambda per_page: 0.1 + per_page * 0.05
+        self.autotune()
+        self.requests = []
+        self.assertEqual(len(self.goodreads.get_books()), self.review_count)
+        self.assertEqual(self.requests, [(100, page) for page in range(2, 6)])
+
+
+class TestShelvesDownload(unittest.TestCase):
+
+    shelves = ['read', 'currently-reading', 'to-read']
+
+    def setUp(self):
+        self.goodreads = Goodreads(mock.Mock())
+        self.xml_factory = GoodreadsXMLFactory()
+        self.lock = threading.Lock()
+        self.requests = []
+        self.overlap = 0
+        self.goodreads.session.post = self.fake_post
+
+    def fake_post(self, url, data):
+        # 10 reviews per shelf, with ids following on from one shelf to the
+        # next unless some of them overlap
+        shelf, page = data['shelf'], data['page']
+        with self.lock:
+            self.requests.append((shelf, page, threading.get_ident()))
+        offset = self.shelves.index(shelf) * (10 - self.overlap)
+        content = self.xml_factory.create_full_xml_response(
+            reviews=10,
+            start_cnt=(page-1) * 5 + 1,
+            end_cnt=page * 5)
+        response = mock.Mock()
+        response.content = re.sub(
+            r"(<id>|Title )(\d+)",
+            lambda match: match.group(1) + str(int(match.group(2)) + offset),
+            content)
+        return response
+
+    def test_books_by_shelf(self):
+        books = self.goodreads.get_books_by_shelf(self.shelves)
+        self.assertEqual(list(books), self.shelves)
+        self.assertEqual([len(shelf) for shelf in books.values()],
+                         [10, 10, 10])
+        self.assertEqual(books['to-read'][0].title, "Wonderful Book Title 20")
+        self.assertEqual(len(self.goodreads.books), 30)
+
+    def test_one_thread_per_shelf(self):
+        self.goodreads.get_books_by_shelf(self.shelves)
+        threads = {}
+        for shelf, _, thread in self.requests:
+            threads.setdefault(shelf, set()).add(thread)
+        self.assertEqual(len(threads), 3)
+        self.assertTrue(all(len(ids) == 1 for ids in threads.values()))
+
+    def test_duplicates_count_once(self):
+        self.overlap = 2
+        books = self.goodreads.get_books_by_shelf(self.shelves)
+        self.assertEqual([len(shelf) for shelf in books.values()],
+                         [10, 8, 8])
+        self.assertEqual(books['currently-reading'][0].title,
+                         "Wonderful Book Title 10")
+
+    def test_shared_store(self):
+        store = ReviewStore(':memory:')
+        self.goodreads.get_books_by_shelf(self.shelves, store=store)
+        self.assertEqual([store.count(shelf) for shelf in self.shelves],
+                         [10, 10, 10])
+        store.close()
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = Stats()
+        self.xml_factory = GoodreadsXMLFactory()
+        self.content = self.xml_factory.create_full_xml_response(reviews=3)
+
+        session = mock.Mock()
+        session.post.return_value.content = self.content
+        session.post.return_value.iter_content.return_value = [
+            self.content.encode('utf-8')]
+        self.goodreads = Goodreads(session, stats=self.stats)
+
+    def test_counters(self):
+        self.goodreads.get_books()
+        counters = self.stats.report()['counters']
+        self.assertEqual(counters['requests'], 1)
+        self.assertEqual(counters['bytes'], len(self.content))
+        self.assertEqual(counters['reviews parsed'], 3)
+        self.assertNotIn('parse failures', counters)
+
+    def test_timers(self):
+        self.goodreads.get_books()
+        timers = self.stats.report()['timers']
+        self.assertEqual(list(timers), ['network', 'xml parsing',
+                                        'parse_date_read', 'parse_author',
+                                        'parse_shelves'])
+        self.assertEqual(timers['parse_author']['calls'], 3)
+
+    def test_streaming(self):
+        self.goodreads.streaming = True
+        self.goodreads.get_books()
+        counters = self.stats.report()['counters']
+        self.assertEqual(counters['requests'], 1)
+        self.assertEqual(counters['bytes'],
+                         len(self.content.encode('utf-8')))
+        self.assertEqual(counters['reviews parsed'], 3)
+        self.assertEqual(self.stats.report()['timers']['parse_shelves']
+                         ['calls'], 3)
+
+    def test_parse_failures(self):
+        self.goodreads.session.post.return_value.content = re.sub(
+            "<authors>.*?</authors>", "", self.content, flags=re.DOTALL)
+        self.goodreads.get_books()
+        self.assertEqual(self.stats.report()['counters']['parse failures'],
+                         3)
+
+
+class TestParseAnomalies(unittest.TestCase):
+
+    def setUp(self):
+        self.goodreads = Goodreads(mock.Mock())
+        self.xml_factory = GoodreadsXMLFactory()
+        content = self.xml_factory.create_full_xml_response(reviews=4)
+        # Two reviews without a read date, one with a date we can't read
+        content = re.sub("<read_at>[^<]*</read_at>", "<read_at></read_at>",
+                         content, count=3)
+        content = content.replace("<read_at></read_at>",
+                                  "<read_at>Someday</read_at>", 1)
+        self.goodreads.session.post.return_value.content = content
+        self.goodreads.session.post.return_value.iter_content.return_value = [
+            content.encode('utf-8')]
+
+    def test_summary_per_page(self):
+        with self.assertLogs('goodreads', 'INFO') as logs:
+            self.goodreads.get_books()
+        summaries = [line for line in logs.output if "Reviews on" in line]
+        self.assertEqual(summaries, [
+            "WARNING:goodreads:Reviews on page 1 of read: "
+            "2 missing read date, 1 unparsed read date"])
+
+    def test_summary_per_page_streaming(self):
+        self.goodreads.streaming = True
+        with self.assertLogs('goodreads', 'INFO') as logs:
+            self.goodreads.get_books()
+        self.assertIn("2 missing read date, 1 unparsed read date",
+                      logs.output[-1])
+
+    def test_no_details_unless_debugging(self):
+        with self.assertLogs('goodreads', 'INFO') as logs:
+            self.goodreads.get_books()
+        self.assertFalse(any("review 123" in line for line in logs.output))
+
+        with self.assertLogs('goodreads', 'DEBUG') as logs:
+            self.goodreads.get_books()
+        self.assertIn("DEBUG:goodreads:Missing read date (review 1234567891)",
+                      logs.output)
+
+    def test_no_traceback_for_missing_date(self):
+        review = {'id': 1, 'read_at': None,
+                  'date_updated': "Thu Feb 15 13:54:37 -0800 2018"}
+        with mock.patch.object(self.goodreads.logger, 'exception') as log:
+            self.goodreads.parse_date_read(review, "Title")
+        log.assert_not_called()
+
+    def test_counts_are_per_page(self):
+        self.goodreads.get_books()
+        self.goodreads.log_anomalies("nothing")
+        self.assertEqual(self.goodreads.anomalies.counts, {})
+
+    def test_counts_are_per_thread(self):
+        self.goodreads.anomaly('missing read date', 1)
+        thread = threading.Thread(
+            target=self.goodreads.anomaly, args=('missing author', 2))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.goodreads.anomalies.counts,
+                         {'missing read date': 1})
+
+
+class TestProcessPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPoolExecutor(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def setUp(self):
+        xml_factory = GoodreadsXMLFactory()
+        self.pages = [xml_factory.create_full_xml_response(
+            reviews=7, authors=2, shelves=2, start_cnt=start, end_cnt=end)
+            for start, end in [(1, 3), (4, 6), (7, 7)]]
+        self.session = mock.Mock()
+        self.session.post.side_effect = lambda url, data: mock.Mock(
+            content=self.pages[data['page'] - 1], status_code=200)
+
+    def test_pickled_book(self):
+        book = Book("Title", "Author", parse_date(
+            "Thu Feb 15 13:54:37 -0800 2018"), ["fr", "read"], "1",
+            "Fri Feb 16 13:54:37 -0800 2018", True)
+        copy = pickle.loads(pickle.dumps(book))
+        self.assertEqual(copy.to_record(), book.to_record())
+        self.assertEqual(copy.date_read, book.date_read)
+        self.assertTrue(copy.date_read_estimated)
+        self.assertIs(copy.shelves, book.shelves)
+
+    def test_parse_page(self):
+        end, total, books, anomalies = parse_page(self.pages[1])
+        self.assertEqual((end, total), (6, 7))
+        self.assertEqual([book.title for book in books],
+                         ["Wonderful Book Title %d" % n for n in range(3, 6)])
+        self.assertEqual(anomalies, {})
+
+    def test_same_books(self):
+        expected = Goodreads(self.session).get_books(jobs=2)
+        books = Goodreads(self.session, pool=self.pool).get_books(jobs=2)
+        self.assertEqual([book.to_record() for book in books],
+                         [book.to_record() for book in expected])
+
+    def test_anomalies(self):
+        self.pages = [self.pages[0].replace(
+            "<read_at>", "<read_at>Someday", 1)]
+        stats = Stats()
+        goodreads = Goodreads(self.session, pool=self.pool, stats=stats)
+        with self.assertLogs('goodreads', 'INFO') as logs:
+            end, total, books = goodreads.retrieve_page()
+        self.assertEqual(len(books), 3)
+        self.assertIn("WARNING:goodreads:Reviews on page 1 of read: "
+                      "1 unparsed read date", logs.output)
+        self.assertEqual(stats.counters['parse failures'], 1)
+        self.assertEqual(stats.counters['reviews parsed'], 3)
+
+    def test_async_download(self):
+        async def post(url, data):
+            return self.session.post(url, data)
+        goodreads = Goodreads(mock.Mock(post=post), pool=self.pool)
+        goodreads.user_id = "1234"
+        loop = asyncio.new_event_loop()
+        try:
+            books = loop.run_until_complete(goodreads.get_books_async())
+        finally:
+            loop.close()
+        expected = Goodreads(self.session).get_books()
+        self.assertEqual([book.to_record() for book in books],
+                         [book.to_record() for book in expected])
+
+    def test_parse_pages_in_order(self):
+        goodreads = Goodreads(None, pool=self.pool)
+        books = list(goodreads.parse_pages(
+            [page.encode('utf-8') for page in self.pages], jobs=2))
+        self.assertEqual([book.title for book in books],
+                         ["Wonderful Book Title %d" % n for n in range(7)])
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp isn't installed")
+class TestAsyncDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        token_file = os.path.join(self.directory, 'token')
+        with open(token_file, 'w') as f:
+            f.write("token\ntoken secret\n")
+
+        xml_factory = GoodreadsXMLFactory()
+        pages = [xml_factory.create_full_xml_response(
+            reviews=7, authors=2, shelves=2, start_cnt=start, end_cnt=end)
+            for start, end in [(1, 3), (4, 6), (7, 7)]]
+        self.server = StubGoodreadsServer(pages).start()
+        self.session = AsyncGoodreadsSession("key", "secret",
+                                             filename=token_file)
+        self.goodreads = Goodreads(self.session, per_page=3)
+        self.goodreads.base_url = self.server.url
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.run_until_complete(self.session.close())
+            loop.close()
+
+    def test_get_books(self):
+        books = self.run_async(self.goodreads.get_books_async())
+        self.assertEqual(self.goodreads.user_id, "1234")
+        self.assertEqual([book.title for book in books],
+                         ["Wonderful Book Title %d" % n for n in range(7)])
+        self.assertEqual(books, self.goodreads.books)
+
+        pages = [parameters['page'] for method, path, _, parameters
+                 in self.server.requests if method == 'POST']
+        self.assertEqual(sorted(pages), ['1', '2', '3'])
+        self.assertEqual(self.server.requests[1][3]['per_page'], '3')
+
+    def test_same_as_get_books(self):
+        self.goodreads.user_id = "1234"
+        books = self.run_async(self.goodreads.get_books_async())
+
+        session = mock.Mock()
+        session.post.side_effect = lambda url, data: mock.Mock(
+            content=self.server.pages[data['page'] - 1], status_code=200)
+        expected = Goodreads(session).get_books()
+        self.assertEqual([book.to_record() for book in books],
+                         [book.to_record() for book in expected])
+
+    def test_shelves(self):
+        books = self.run_async(
+            self.goodreads.get_books_by_shelf_async(['read', 'to-read']))
+        self.assertEqual(list(books), ['read', 'to-read'])
+        # Both shelves get the same pages here, the books only count once
+        self.assertEqual(len(books['read']), 7)
+        self.assertEqual(books['to-read'], [])
+        self.assertEqual(sum(1 for request in self.server.requests
+                             if request[0] == 'GET'), 1)
+
+    def test_stats(self):
+        stats = Stats()
+        self.goodreads.stats = stats
+        self.run_async(self.goodreads.get_books_async())
+        self.assertEqual(stats.counters['requests'], 4)
+        self.assertEqual(stats.counters['reviews parsed'], 7)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import socket
+import unittest
+from unittest import mock
+
+from rattle_cli.goodreads_session import GoodreadsSession, KeepAliveAdapter
+
+
+class TestSessionConfiguration(unittest.TestCase):
+
+    def setUp(self):
+        self.session = GoodreadsSession("key", "secret", pool_size=8)
+        self.session.access_token = "token"
+        self.session.access_token_secret = "token secret"
+        self.session.reopen_session()
+
+    def test_adapter(self):
+        adapter = self.session.session.get_adapter("https://www.goodreads.com")
+        self.assertIs(adapter, self.session.adapter)
+        self.assertIsInstance(adapter, KeepAliveAdapter)
+        self.assertEqual(adapter._pool_maxsize, 8)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertFalse(adapter.max_retries.read)
+
+    def test_keep_alive(self):
+        pool = self.session.adapter.poolmanager.connection_from_url(
+            "https://www.goodreads.com")
+        self.assertIn((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                      pool.conn_kw['socket_options'])
+
+    def test_headers(self):
+        headers = self.session.session.headers
+        self.assertEqual(headers['Accept-Encoding'], 'gzip, deflate')
+        self.assertEqual(headers['Connection'], 'keep-alive')
+
+    def test_connection_stats(self):
+        pool = self.session.adapter.poolmanager.connection_from_url(
+            "https://www.goodreads.com")
+        pool.num_requests = 12
+        pool.num_connections = 3
+        self.assertEqual(self.session.connection_stats(),
+                         {'requests': 12, 'new_connections': 3,
+                          'reused_connections': 9})
+
+    def test_connection_stats_no_session(self):
+        session = GoodreadsSession("key", "secret")
+        self.assertEqual(session.connection_stats()['requests'], 0)
+
+    def test_token_file(self):
+        session = GoodreadsSession("key", "secret", filename="tokens/alice")
+        self.assertEqual(session.filename, "tokens/alice")
+        self.assertEqual(GoodreadsSession("key", "secret").filename,
+                         ".access_token")
+
+    def test_new_session_is_configured(self):
+        session = GoodreadsSession("key", "secret")
+        service = mock.Mock()
+        service.get_authorize_url.return_value = "https://example.com"
+        service.get_request_token.return_value = ("token", "secret")
+        service.get_auth_session.return_value = mock.MagicMock()
+        with mock.patch('rattle_cli.goodreads_session.OAuth1Service',
+                        return_value=service), \
+                mock.patch('builtins.input', return_value='y'), \
+                mock.patch('builtins.print'):
+            session.get_new_session()
+        session.session.mount.assert_called_with('http://', session.adapter)
+
+
+class TestScheduledSession(unittest.TestCase):
+
+    def test_requests_go_through_scheduler(self):
+        scheduler = mock.Mock()
+        session = GoodreadsSession("key", "secret", scheduler=scheduler)
+        session.session = mock.Mock()
+
+        session.post("https://example.com", {'page': 1})
+        scheduler.send.assert_called_once_with(
+            session.session.post, "https://example.com", {'page': 1})
+
+    def test_cache_hits_skip_scheduler(self):
+        scheduler = mock.Mock()
+        cache = mock.Mock()
+        session = GoodreadsSession("key", "secret", cache,
+                                   scheduler=scheduler)
+        session.session = mock.Mock()
+
+        session.get("https://example.com")
+        send = cache.fetch.call_args[0][0]
+        self.assertEqual(send.func, scheduler.send)
+        scheduler.send.assert_not_called()
+
+    def test_uncached_request(self):
+        cache = mock.Mock()
+        session = GoodreadsSession("key", "secret", cache)
+        session.session = mock.Mock()
+
+        session.post("https://example.com", {'page': 1}, cached=False)
+        cache.fetch.assert_not_called()
+        session.session.post.assert_called_once_with("https://example.com",
+                                                     {'page': 1})
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from rattle_cli.goodreads_session import GoodreadsSession
+from rattle_cli.http_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    url = "https://www.goodreads.com/review/list/1234.xml"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResponseCache(self.directory)
+        self.send = mock.Mock(side_effect=self.fake_send)
+        self.headers = {}
+        self.status_code = 200
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fake_send(self, url, data=None, headers=None, stream=False):
+        response = mock.Mock()
+        response.status_code = self.status_code
+        response.headers = self.headers
+        response.content = ("Page %s" % data['page']).encode('utf-8')
+        return response
+
+    def fetch(self, page=1, **kwargs):
+        return self.cache.fetch(self.send, 'post', self.url, {'page': page},
+                                **kwargs)
+
+    def age(self, seconds):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            entry = self.cache.load(name[:-len('.json')])
+            entry['stored'] -= seconds
+            self.cache.save(name[:-len('.json')], entry)
+            os.utime(path, (time.time() - seconds,) * 2)
+
+    def test_hit(self):
+        self.assertEqual(self.fetch().content, b"Page 1")
+        self.assertEqual(self.fetch().content, b"Page 1")
+        self.assertEqual(self.fetch(stream=True).content, b"Page 1")
+        self.assertEqual(self.send.call_count, 1)
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_different_requests(self):
+        self.fetch(1)
+        self.fetch(2)
+        self.fetch(1, namespace="Someone else")
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual(self.fetch(2).content, b"Page 2")
+        self.assertEqual(self.send.call_count, 3)
+
+    def test_iter_content(self):
+        self.fetch()
+        response = self.fetch(stream=True)
+        self.assertEqual(b"".join(response.iter_content(2)), b"Page 1")
+
+    def test_expired(self):
+        self.fetch()
+        self.age(10 * 60)
+        self.fetch()
+        self.assertEqual(self.send.call_count, 2)
+        _, kwargs = self.send.call_args
+        self.assertNotIn('headers', kwargs)
+
+    def test_per_endpoint_ttl(self):
+        self.assertEqual(self.cache.ttl(self.url), 5 * 60)
+        self.assertEqual(self.cache.ttl(
+            "https://www.goodreads.com/api/auth_user"), 24 * 60 * 60)
+        self.assertEqual(self.cache.ttl(
+            "https://www.goodreads.com/book/show/1.xml"), 0)
+
+    def test_revalidated(self):
+        self.headers = {'ETag': '"abc"',
+                        'Last-Modified': 'Thu, 15 Feb 2018 13:54:37 GMT'}
+        self.fetch()
+        self.age(10 * 60)
+
+        self.status_code = 304
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"Page 1")
+        _, kwargs = self.send.call_args
+        self.assertEqual(kwargs['headers'], {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Thu, 15 Feb 2018 13:54:37 GMT'})
+        self.assertEqual(self.cache.revalidated, 1)
+
+        # Fresh again after revalidating
+        self.fetch()
+        self.assertEqual(self.send.call_count, 2)
+
+    def test_errors_are_not_cached(self):
+        self.status_code = 500
+        self.fetch()
+        self.fetch()
+        self.assertEqual(self.send.call_count, 2)
+
+    def test_refresh(self):
+        self.fetch()
+        cache = ResponseCache(self.directory, refresh=True)
+        cache.fetch(self.send, 'post', self.url, {'page': 1})
+        self.assertEqual(self.send.call_count, 2)
+
+    def test_evict_least_recently_used(self):
+        self.fetch(1)
+        size = sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory))
+        self.cache.max_size = size * 1.5
+        self.age(60)
+        self.fetch(2)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertEqual(self.fetch(2).content, b"Page 2")
+        self.assertEqual(self.send.call_count, 2)
+
+
+class TestCachedSession(unittest.TestCase):
+
+    def test_session_uses_cache(self):
+        cache = mock.Mock()
+        session = GoodreadsSession("key", "secret", cache)
+        session.session = mock.Mock()
+        session.access_token = "token"
+
+        session.post("https://example.com", {'page': 1}, stream=True)
+        cache.fetch.assert_called_once_with(
+            session.session.post, 'post', "https://example.com", {'page': 1},
+            namespace="token", stream=True)
+
+    def test_session_without_cache(self):
+        session = GoodreadsSession("key", "secret")
+        session.session = mock.Mock()
+        session.get("https://example.com")
+        session.session.get.assert_called_once_with("https://example.com")
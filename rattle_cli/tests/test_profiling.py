@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from rattle_cli.profiling import Stats
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.stats = Stats(clock=lambda: self.now)
+
+    def test_timer(self):
+        for seconds in [1.5, 0.5]:
+            with self.stats.timer('network'):
+                self.now += seconds
+        self.assertEqual(self.stats.report()['timers'],
+                         {'network': {'seconds': 2.0, 'calls': 2}})
+
+    def test_timer_exception(self):
+        with self.assertRaises(ValueError):
+            with self.stats.timer('parsing'):
+                self.now += 1
+                raise ValueError()
+        self.assertEqual(self.stats.report()['timers']['parsing']['seconds'],
+                         1)
+
+    def test_count(self):
+        self.stats.count('requests')
+        self.stats.count('bytes', 100)
+        self.stats.count('bytes', 20)
+        self.assertEqual(self.stats.report()['counters'],
+                         {'requests': 1, 'bytes': 120})
+
+    def test_count_threads(self):
+        def count():
+            for _ in range(1000):
+                self.stats.count('reviews parsed')
+
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.stats.report()['counters']['reviews parsed'],
+                         4000)
+
+    def test_print_summary(self):
+        with self.stats.timer('network'):
+            self.now += 1.25
+        self.stats.count('requests', 3)
+        output = io.StringIO()
+        self.stats.print_summary(output)
+        self.assertEqual(output.getvalue().splitlines(), [
+            "Profile",
+            "  network                        1.250s          1 calls",
+            "  requests                            3"])
+
+    def test_write_json(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'profile.json')
+        self.stats.count('requests')
+        self.stats.write_json(filename)
+        with open(filename) as f:
+            self.assertEqual(json.load(f), self.stats.report())
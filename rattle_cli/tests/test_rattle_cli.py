@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir,
+                                      'rattle_cli.py'))
+
+
+class TestCommandLine(unittest.TestCase):
+
+    # The whole script, on a library export so that nothing needs to talk
+    # to Goodreads
+    export = (
+        "Book Id,Title,Author,Author l-f,Additional Authors,ISBN,My Rating,"
+        "Date Read,Date Added,Bookshelves,Exclusive Shelf,My Review\n"
+        "1,Vol de nuit,Antoine de Saint-Exupéry,,,,4,"
+        "2016/03/04,2016/01/01,fr,read,\n"
+        "2,The Final Empire,Brandon Sanderson,,,,0,,2015/02/02,,read,\n"
+        "3,Later,Someone,,,,0,,2016/05/01,fr,to-read,\n")
+
+    def setUp(self):
+        # The log and snapshot end up in there as well
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'export.csv')
+        with open(self.filename, 'w', encoding='utf-8-sig') as f:
+            f.write(self.export)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_script(self, *args, source=('--from-csv',)):
+        return subprocess.run(
+            [sys.executable, SCRIPT, '--lang', 'fr', '--other'] +
+            list(source) + [self.filename] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, cwd=self.directory)
+
+    def test_repeated_shelf(self):
+        process = self.run_script('--status-shelf', 'read', 'read')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout, self.run_script().stdout)
+        self.assertIn("fr: 1", process.stdout)
+
+    def test_repeated_shelves(self):
+        process = self.run_script('--status-shelf', 'read', 'to-read',
+                                  'read')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        rows = process.stdout.splitlines()[2:]
+        self.assertEqual([row.split() for row in rows],
+                         [['read', '1', '1'], ['to-read', '0', '1']])
+
+    def test_pages_for_several_shelves(self):
+        process = self.run_script('--status-shelf', 'read', 'to-read',
+                                  source=('--from-xml',))
+        self.assertEqual(process.returncode, 2)
+        self.assertIn("--from-xml only works with a single --status-shelf",
+                      process.stderr)
+
+    def test_reversed_years(self):
+        process = self.run_script('--years', '2020-2018')
+        self.assertEqual(process.returncode, 2)
+        self.assertIn("2020-2018 is not a range of years", process.stderr)
+        process = self.run_script('--years', '2015-2016')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(len(process.stdout.splitlines()), 4)
+
+    def test_no_workers(self):
+        for workers in ('0', '-1', 'x'):
+            process = self.run_script('--workers', workers)
+            self.assertEqual(process.returncode, 2)
+            self.assertIn("argument --workers: %s is not a number above 0"
+                          % workers, process.stderr)
+
+    def test_no_processes(self):
+        for processes in ('0', '-1'):
+            process = self.run_script('--processes', processes)
+            self.assertEqual(process.returncode, 2)
+            self.assertIn("argument --processes: %s is not a number above 0"
+                          % processes, process.stderr)
+        process = self.run_script('--processes', '1')
+        self.assertEqual(process.returncode, 0, process.stderr)
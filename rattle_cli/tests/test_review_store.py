@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from rattle_cli.review_store import ReviewStore
+
+
+class TestReviewStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ReviewStore(':memory:')
+        self.records = [
+            ("3", "Book #3", "An author", "Fri Mar 04 00:00:00 -0800 2016",
+             "Fri Mar 04 00:00:00 -0800 2016", ["read", "fr"]),
+            ("2", "Book #2", "An author", "",
+             "Thu Feb 15 13:54:37 -0800 2018", ["read"]),
+            ("1", "Book #1", "村上春樹", "Mon Jan 04 00:00:00 -0800 2016",
+             "Mon Jan 04 00:00:00 -0800 2016", ["read", "ja"])]
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_empty(self):
+        self.assertEqual(self.store.count('read'), 0)
+        self.assertEqual(list(self.store.load('read')), [])
+
+    def test_replace_and_load(self):
+        self.store.replace('read', self.records)
+        self.assertEqual(self.store.count('read'), 3)
+        self.assertEqual(self.store.count('to-read'), 0)
+        self.assertEqual(list(self.store.load('read')), self.records)
+
+    def test_replace_twice(self):
+        self.store.replace('read', self.records)
+        self.store.replace('read', self.records[1:])
+        self.assertEqual(list(self.store.load('read')), self.records[1:])
+
+    def test_is_current(self):
+        self.store.replace('read', self.records)
+        self.assertTrue(self.store.is_current(
+            "2", "Thu Feb 15 13:54:37 -0800 2018"))
+        self.assertFalse(self.store.is_current(
+            "2", "Fri Feb 16 13:54:37 -0800 2018"))
+        self.assertFalse(self.store.is_current(
+            "4", "Thu Feb 15 13:54:37 -0800 2018"))
+
+    def test_fingerprint(self):
+        self.store.replace('read', self.records)
+        self.store.replace('to-read', self.records[:1])
+        fingerprint = self.store.fingerprint('read')
+        self.assertEqual(self.store.fingerprint('read'), fingerprint)
+        self.assertNotEqual(self.store.fingerprint('to-read'), fingerprint)
+
+        updated = self.records[1][:4] + ("Fri Feb 16 13:54:37 -0800 2018",
+                                         ["read", "fr"])
+        self.store.prepend('read', [updated])
+        self.assertNotEqual(self.store.fingerprint('read'), fingerprint)
+
+    def test_prepend(self):
+        self.store.replace('read', self.records[1:])
+        self.store.prepend('read', self.records[:2])
+        self.assertEqual(list(self.store.load('read')), self.records)
+
+    def test_prepend_updated_review(self):
+        self.store.replace('read', self.records)
+        updated = ("1", "Book #1", "村上春樹", "Sat Jan 04 00:00:00 -0800 2020",
+                   "Sat Jan 04 00:00:00 -0800 2020", ["read", "ja"])
+        self.store.prepend('read', [updated])
+        self.assertEqual(list(self.store.load('read')),
+                         [updated] + self.records[:2])
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+
+from rattle_cli.scheduler import RequestScheduler, TokenBucket
+
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2.0, capacity=1, clock=self.clock,
+                                  sleep=self.clock.sleep)
+
+    def test_rate(self):
+        self.assertEqual(self.bucket.acquire(), 0)
+        for _ in range(10):
+            self.bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 5.0)
+
+    def test_no_wait_after_idling(self):
+        self.bucket.acquire()
+        self.clock.now += 10
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertAlmostEqual(self.bucket.acquire(), 0.5)
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1.0, capacity=3, clock=self.clock,
+                             sleep=self.clock.sleep)
+        for _ in range(3):
+            self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+
+    def test_slow_down_and_speed_up(self):
+        self.bucket.slow_down()
+        self.assertEqual(self.bucket.rate, 1.0)
+        for _ in range(20):
+            self.bucket.slow_down()
+        self.assertEqual(self.bucket.rate, self.bucket.min_rate)
+        for _ in range(30):
+            self.bucket.speed_up()
+        self.assertEqual(self.bucket.rate, 2.0)
+
+
+class TestRequestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=1.0, clock=self.clock,
+                                  sleep=self.clock.sleep)
+        self.scheduler = RequestScheduler(self.bucket, max_retries=3,
+                                          sleep=self.clock.sleep)
+
+    def response(self, status_code, headers=None):
+        response = mock.Mock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        return response
+
+    def test_success(self):
+        send = mock.Mock(return_value=self.response(200))
+        response = self.scheduler.send(send, "url", {'page': 1}, stream=True)
+        self.assertEqual(response.status_code, 200)
+        send.assert_called_once_with("url", {'page': 1}, stream=True)
+        self.assertEqual(self.scheduler.stats()['requests'], 1)
+        self.assertEqual(self.scheduler.stats()['retries'], 0)
+
+    def test_paced(self):
+        send = mock.Mock(return_value=self.response(200))
+        for _ in range(5):
+            self.scheduler.send(send, "url")
+        self.assertAlmostEqual(self.clock.now, 4.0)
+        self.assertAlmostEqual(self.scheduler.stats()['throttled'], 4.0)
+
+    def test_retry_server_errors(self):
+        send = mock.Mock(side_effect=[self.response(503),
+                                      self.response(500),
+                                      self.response(200)])
+        response = self.scheduler.send(send, "url")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(self.scheduler.stats()['retries'], 2)
+
+    def test_give_up(self):
+        send = mock.Mock(return_value=self.response(502))
+        response = self.scheduler.send(send, "url")
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(send.call_count, 4)
+
+    def test_no_retry_client_errors(self):
+        send = mock.Mock(return_value=self.response(404))
+        self.assertEqual(self.scheduler.send(send, "url").status_code, 404)
+        self.assertEqual(send.call_count, 1)
+
+    def test_retry_connection_errors(self):
+        send = mock.Mock(side_effect=[ConnectionError("Oops"),
+                                      self.response(200)])
+        self.assertEqual(self.scheduler.send(send, "url").status_code, 200)
+
+        send = mock.Mock(side_effect=ConnectionError("Oops"))
+        with self.assertRaises(ConnectionError):
+            self.scheduler.send(send, "url")
+        self.assertEqual(send.call_count, 4)
+
+    def test_too_many_requests(self):
+        send = mock.Mock(side_effect=[
+            self.response(429, {'Retry-After': '30'}),
+            self.response(200)])
+        with mock.patch('random.uniform', return_value=0.5):
+            self.scheduler.send(send, "url")
+        self.assertLess(self.bucket.rate, 1.0)
+        self.assertAlmostEqual(self.scheduler.stats()['backed_off'], 30.0)
+
+    def test_backoff_grows(self):
+        with mock.patch('random.uniform', side_effect=lambda a, b: b):
+            delays = [self.scheduler.backoff_delay(n) for n in range(8)]
+        self.assertEqual(delays, [1, 2, 4, 8, 16, 32, 60, 60])
+
+    def test_retry_after_date(self):
+        response = self.response(
+            503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEqual(self.scheduler.retry_after(response), 0)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from rattle_cli.snapshot import StatsSnapshot
+
+
+class TestStatsSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'snapshot')
+        self.snapshot = StatsSnapshot(self.filename)
+        self.counts = [[2016, ['fr', 'read'], 3], [None, ['read'], 1]]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_nothing_saved(self):
+        self.assertIsNone(self.snapshot.load('read', 'abc'))
+
+    def test_save_and_load(self):
+        self.snapshot.save('read', 'abc', self.counts)
+        self.snapshot.save('to-read', 'def', [])
+        snapshot = StatsSnapshot(self.filename)
+        self.assertEqual(snapshot.load('read', 'abc'), self.counts)
+        self.assertEqual(snapshot.load('to-read', 'def'), [])
+        self.assertEqual(os.listdir(self.directory), ['snapshot'])
+
+    def test_reviews_changed(self):
+        self.snapshot.save('read', 'abc', self.counts)
+        self.assertIsNone(self.snapshot.load('read', 'abd'))
+        self.snapshot.save('read', 'abd', [])
+        self.assertEqual(self.snapshot.load('read', 'abd'), [])
+
+    def test_other_version(self):
+        self.snapshot.save('read', 'abc', self.counts)
+        with open(self.filename) as f:
+            snapshot = json.load(f)
+        snapshot['version'] += 1
+        with open(self.filename, 'w') as f:
+            json.dump(snapshot, f)
+        self.assertIsNone(self.snapshot.load('read', 'abc'))
+
+    def test_broken_file(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"version": 1, "shel')
+        self.assertIsNone(self.snapshot.load('read', 'abc'))
+        self.snapshot.save('read', 'abc', self.counts)
+        self.assertEqual(self.snapshot.load('read', 'abc'), self.counts)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir,
+                                      'rattle_cli.py'))
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime is new in 3.7")
+class TestStartup(unittest.TestCase):
+
+    # Nothing needed to talk to Goodreads or store reviews should be
+    # imported just to show the help
+    slow_modules = ['rauth', 'requests', 'xmltodict', 'secrets', 'sqlite3',
+                    'asyncio', 'aiohttp', 'concurrent.futures', 'goodreads',
+                    'goodreads_session', 'review_store', 'async_session',
+                    'batch', 'data_sources']
+    # The modules the script can't do without, to compare with rather than
+    # a fixed number of microseconds that depends on the machine. The rest
+    # of its imports should only take a few times as long as these.
+    baseline = ['-c', 'import argparse, logging']
+    factor = 4
+
+    def setUp(self):
+        # Somewhere for the script to write its log to
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def import_times(self, *args):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime'] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, cwd=self.directory)
+        self.assertEqual(process.returncode, 0, process.stderr)
+
+        # Lines look like "import time: 1535 | 2487 |   argparse", with
+        # the modules imported by another one indented under it
+        times = {}
+        top_level = []
+        for line in process.stderr.splitlines():
+            if not line.startswith('import time:') or '[us]' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative)
+            if not name.startswith('  '):
+                top_level.append((name.strip(), int(cumulative)))
+
+        # Everything up to site is imported by Python itself, i.e. the
+        # total only counts the modules imported by the script (or the
+        # baseline) and everything they import in turn
+        names = [name for name, _ in top_level]
+        script = top_level[names.index('site') + 1:]
+        return times, sum(cumulative for _, cumulative in script)
+
+    def test_help_skips_slow_modules(self):
+        times, _ = self.import_times(SCRIPT, '--help')
+        for module in self.slow_modules:
+            self.assertNotIn(module, times)
+
+    def test_help_import_time(self):
+        # Best of a few runs, the first one may have to compile the modules
+        total = min(self.import_times(SCRIPT, '--help')[1]
+                    for _ in range(5))
+        baseline = min(self.import_times(*self.baseline)[1]
+                       for _ in range(5))
+        self.assertLess(total, baseline * self.factor)
@@ -18,10 +18,11 @@ class GoodreadsXMLFactory():
 
     review_tag = """
 <review>
-  <id>1234567890</id>
+  <id>{review_id}</id>
   <book>{book}</book>
   <shelves>{shelves}</shelves>
   <read_at>{read_at}</read_at>
+  <date_updated>{date_updated}</date_updated>
   <body>
       <![CDATA[面白かったです。]]>
   </body>
@@ -52,7 +53,7 @@ class GoodreadsXMLFactory():
             reviews = end_cnt - start_cnt + 1
 
         response = ""
-        for n in range(0, reviews):
+        for n in range(start_cnt - 1, start_cnt - 1 + reviews):
             response += self.create_review(n, authors, d, shelves)
 
         details = {'reviews': response,
@@ -69,9 +70,11 @@ class GoodreadsXMLFactory():
         read_at = self.create_read_at_date(d)
         shelves = self.create_shelves(shelves)
 
-        review = self.review_tag.format_map({'book': book,
+        review = self.review_tag.format_map({'review_id': 1234567890 + num,
+                                             'book': book,
                                              'shelves': shelves,
-                                             'read_at': read_at})
+                                             'read_at': read_at,
+                                             'date_updated': read_at})
 
         return review
 